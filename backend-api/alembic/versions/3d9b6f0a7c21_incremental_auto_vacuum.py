@@ -0,0 +1,33 @@
+"""incremental auto vacuum
+
+Revision ID: 3d9b6f0a7c21
+Revises: e7a2d5c91f04
+Create Date: 2026-10-17 15:21:09.774160
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d9b6f0a7c21'
+down_revision: Union[str, None] = 'e7a2d5c91f04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # auto_vacuum of an existing database only changes after a full VACUUM,
+    # which cannot run inside a transaction. CompactOrbits then frees pages
+    # with PRAGMA incremental_vacuum.
+    with op.get_context().autocommit_block():
+        op.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        op.execute("VACUUM")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("PRAGMA auto_vacuum=NONE")
+        op.execute("VACUUM")
@@ -0,0 +1,40 @@
+"""latest orbit table
+
+Revision ID: c4f1a7d2e9b3
+Revises: 347036cd8450
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f1a7d2e9b3'
+down_revision: Union[str, None] = '347036cd8450'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('latest_orbit',
+    sa.Column('satellite_id', sa.Integer(), nullable=False),
+    sa.Column('orbit_id', sa.Uuid(), nullable=False),
+    sa.Column('epoch', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['orbit_id'], ['orbit.id'], ),
+    sa.ForeignKeyConstraint(['satellite_id'], ['satellite.id'], ),
+    sa.PrimaryKeyConstraint('satellite_id')
+    )
+    op.execute(
+        """
+        INSERT INTO latest_orbit (satellite_id, orbit_id, epoch)
+        SELECT o.satellite_id, o.id, max(o.epoch) FROM orbit o
+        GROUP BY o.satellite_id;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('latest_orbit')
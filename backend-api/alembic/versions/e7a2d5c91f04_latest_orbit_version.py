@@ -0,0 +1,28 @@
+"""latest orbit version
+
+Revision ID: e7a2d5c91f04
+Revises: c4f1a7d2e9b3
+Create Date: 2026-10-17 14:03:27.540918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a2d5c91f04'
+down_revision: Union[str, None] = 'c4f1a7d2e9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('latest_orbit', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+    op.create_index(op.f('ix_latest_orbit_version'), 'latest_orbit', ['version'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_latest_orbit_version'), table_name='latest_orbit')
+    op.drop_column('latest_orbit', 'version')
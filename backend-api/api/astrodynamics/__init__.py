@@ -1,4 +1,12 @@
 from passpredict.observers import Observer, PredictedPass, PassPoint
 
 from .location import Location
-from .propagator import SGP4Propagator
+from .propagator import (
+    SGP4Propagator,
+    PropagationStats,
+    get_propagator,
+    propagate_ecef_array,
+    record_propagation,
+)
+from .rotations import julian_date_array
+from .solar import sun_pos_ecef_array, sun_pos_ecef_interp, is_illuminated_array
@@ -9,9 +9,17 @@ __all__ = [
     "LatLon",
     "spherical_earth_distance",
     "get_visibility_radius",
+    "footprint_radius",
+    "apogee_altitude",
+    "may_be_visible",
 ]
 
 
+MU_EARTH = 398600.4418   # km3/s2
+# Slack for the spherical Earth model and geodetic latitudes
+VISIBILITY_MARGIN_KM = 50.0
+
+
 class LatLon(NamedTuple):
     lat: float
     lon: float
@@ -31,3 +39,40 @@ def spherical_earth_distance(
 
 
 get_visibility_radius = spherical_earth_distance
+
+
+def footprint_radius(altitude: float, min_elevation_deg: float = 0) -> float:
+    """
+    Surface distance [km] from the sub-satellite point to the edge of the area
+    where a satellite at altitude [km] appears above min_elevation_deg.
+    """
+    el = math.radians(min_elevation_deg)
+    central_angle = math.acos(R_EARTH * math.cos(el) / (R_EARTH + altitude)) - el
+    return R_EARTH * max(central_angle, 0.0)
+
+
+def apogee_altitude(mean_motion: float, eccentricity: float) -> float:
+    """Apogee altitude [km] from mean motion [rev/day] and eccentricity"""
+    n = mean_motion * 2 * math.pi / 86400.0
+    a = (MU_EARTH / (n * n)) ** (1 / 3)
+    return a * (1 + eccentricity) - R_EARTH
+
+
+def may_be_visible(
+    latitude: float,
+    inclination: float,
+    apogee: float,
+    min_elevation_deg: float = 0,
+) -> bool:
+    """
+    False when a satellite can never rise above min_elevation_deg at latitude.
+    The sub-satellite point never goes further from the equator than the
+    inclination, so the observer must be within the footprint of that latitude.
+    The nearest such point is on the observer's meridian, so the surface
+    distance to it follows from the difference in latitude.
+    """
+    max_lat = inclination if inclination <= 90 else 180 - inclination
+    if abs(latitude) <= max_lat:
+        return True
+    distance = R_EARTH * math.radians(abs(latitude) - max_lat)
+    return distance <= footprint_radius(apogee, min_elevation_deg) + VISIBILITY_MARGIN_KM
@@ -71,9 +71,37 @@ class Location:
         cos_lat, cos_long = cos(self.latitude_rad), cos(self.longitude_rad)
         return (cos_lat * cos_long, cos_lat * sin_long, sin_lat)
 
+    def elevation_array(self, recef: np.ndarray) -> np.ndarray:
+        """
+        Computes elevation angles of ECEF positions relative to location.
+        Accepts an array of shape (..., 3) and returns radians with shape (...).
+        """
+        coslatcoslon, coslatsinlon, sinlat = self._cached_elevation_calculation_data
+        rho = recef - self.recef
+        rho_z = rho[..., 0]*coslatcoslon + rho[..., 1]*coslatsinlon + rho[..., 2]*sinlat
+        return np.arcsin(rho_z / np.linalg.norm(rho, axis=-1))
+
+    def razel_array(self, recef: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Computes range [km], azimuth [deg], and elevation [deg] of ECEF positions
+        relative to location. Accepts an array of shape (..., 3).
+        """
+        sin_lat, sin_lon = sin(self.latitude_rad), sin(self.longitude_rad)
+        cos_lat, cos_lon = cos(self.latitude_rad), cos(self.longitude_rad)
+        rx, ry, rz = np.moveaxis(recef - self.recef, -1, 0)
+        rho_s = sin_lat*cos_lon*rx + sin_lat*sin_lon*ry - cos_lat*rz
+        rho_e = -sin_lon*rx + cos_lon*ry
+        rho_z = cos_lat*cos_lon*rx + cos_lat*sin_lon*ry + sin_lat*rz
+        range_ = np.sqrt(rho_s*rho_s + rho_e*rho_e + rho_z*rho_z)
+        el = np.degrees(np.arcsin(rho_z / range_))
+        az = np.degrees(np.arctan2(-rho_e, rho_s) + np.pi)
+        return range_, az, el
+
     def _sun_elevation_mjd(self, mjd: float) -> float:
         """
         Computes elevation angle of sun relative to location. Returns degrees.
+        Single times use the Cython sun position, which is faster than a lookup
+        in the shared sun table; arrays go through `sun_pos_ecef_interp`.
         """
         sun_recef = sun_pos_mjd(mjd)
         coslatcoslon, coslatsinlon, sinlat = self._cached_elevation_calculation_data
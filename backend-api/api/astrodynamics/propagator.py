@@ -1,14 +1,27 @@
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
 from logging import getLogger
+from time import perf_counter
 from typing import NamedTuple
 
+import numpy as np
 from passpredict.satellites import SGP4Propagator as SGP4Propagator_
 from passpredict.time import julian_date_from_datetime
+from sgp4.api import SatrecArray
 
+from api.settings import config
 from api.domain import Orbit, Satellite
+from api.cache import OrbitKeyedCache
+from .rotations import teme_to_ecef_array
 
 
 __all__ = [
     "SGP4Propagator",
+    "PropagationStats",
+    "get_propagator",
+    "propagate_ecef_array",
+    "record_propagation",
 ]
 
 
@@ -20,6 +33,37 @@ class DefaultSatellite(NamedTuple):
 logger = getLogger(__name__)
 
 
+class PropagationStats:
+    """Propagation wall time and SGP4 evaluation counts per NORAD id"""
+
+    def __init__(self):
+        self.seconds: dict[int, float] = {}
+        self.evaluations: dict[int, int] = {}
+
+    def record(self, norad_id: int, seconds: float, evaluations: int) -> None:
+        self.seconds[norad_id] = self.seconds.get(norad_id, 0.0) + seconds
+        self.evaluations[norad_id] = self.evaluations.get(norad_id, 0) + evaluations
+
+    def merge(self, other: 'PropagationStats') -> None:
+        for norad_id, seconds in other.seconds.items():
+            self.record(norad_id, seconds, other.evaluations[norad_id])
+
+
+_propagation_stats: ContextVar[PropagationStats | None] = ContextVar("propagation_stats", default=None)
+
+
+@contextmanager
+def record_propagation(stats: PropagationStats | None = None) -> Iterator[PropagationStats]:
+    """Record vectorized propagation calls made in this context into stats"""
+    if stats is None:
+        stats = PropagationStats()
+    token = _propagation_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _propagation_stats.reset(token)
+
+
 class SGP4Propagator(SGP4Propagator_):
 
     def __init__(
@@ -43,3 +87,68 @@ class SGP4Propagator(SGP4Propagator_):
             no_kozai=orbit.mean_motion,
             raan=orbit.ra_of_asc_node,
         )
+
+    def position_ecef_array(self, jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+        """
+        Propagate to split julian dates and return ECEF positions [km] with shape (T, 3).
+        Rows where SGP4 reports an error are NaN.
+        """
+        stats = _propagation_stats.get()
+        t0 = perf_counter()
+        jd, fr = np.broadcast_arrays(
+            np.asarray(jd, dtype=np.float64),
+            np.asarray(fr, dtype=np.float64),
+        )
+        err, rteme, _ = self._propagator.sgp4_array(np.ascontiguousarray(jd), np.ascontiguousarray(fr))
+        rteme[err != 0] = np.nan
+        recef = teme_to_ecef_array(rteme, jd, fr)
+        if stats is not None:
+            stats.record(self.satid, perf_counter() - t0, jd.size)
+        return recef
+
+
+# Propagators never go stale for an orbit id, so entries only leave the cache
+# through LRU eviction or when a newer orbit for the satellite is observed
+propagator_cache = OrbitKeyedCache[SGP4Propagator](
+    maxsize=config.predict.propagator_cache_size,
+    ttl=float("inf"),
+)
+
+
+def get_propagator(
+    orbit: Orbit,
+    satellite: Satellite = DefaultSatellite(),
+) -> SGP4Propagator:
+    """Return the initialized propagator for orbit from the cache, creating it on a miss"""
+    if orbit.id is None:
+        return SGP4Propagator(orbit=orbit, satellite=satellite)
+    propagator_cache.observe_orbit(orbit.satellite_id, orbit.id)
+    propagator = propagator_cache.get(orbit.id)
+    if propagator is None:
+        propagator = SGP4Propagator(orbit=orbit, satellite=satellite)
+        propagator_cache.set(orbit.id, orbit.satellite_id, propagator)
+    return propagator
+
+
+def propagate_ecef_array(
+    propagators: Sequence[SGP4Propagator],
+    jd: np.ndarray,
+    fr: np.ndarray,
+) -> np.ndarray:
+    """
+    Propagate several satellites on a shared time grid in one call.
+    Returns ECEF positions [km] with shape (N, T, 3).
+    """
+    stats = _propagation_stats.get()
+    t0 = perf_counter()
+    satrecs = SatrecArray([propagator._propagator for propagator in propagators])
+    err, rteme, _ = satrecs.sgp4(jd, fr)
+    rteme[err != 0] = np.nan
+    recef = teme_to_ecef_array(rteme, jd, fr)
+    if stats is not None:
+        # Every satellite is evaluated at every time, so split the time evenly
+        seconds = (perf_counter() - t0) / len(propagators)
+        for propagator in propagators:
+            stats.record(propagator.satid, seconds, jd.size)
+    return recef
+
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import numpy as np
+from passpredict.time import julian_date_from_datetime, make_utc
+
+
+__all__ = [
+    "julian_date_array",
+    "gmst_array",
+    "teme_to_ecef_array",
+]
+
+
+def julian_date_array(
+    start: datetime,
+    offsets: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute split julian dates (jd, fr) for offsets in seconds from start.
+    The whole-day part is shared so precision is kept over long windows.
+    """
+    jd0, fr0 = julian_date_from_datetime(make_utc(start))
+    offsets = np.asarray(offsets, dtype=np.float64)
+    jd = np.full(offsets.shape, jd0, dtype=np.float64)
+    fr = fr0 + offsets / 86400.0
+    return jd, fr
+
+
+def gmst_array(jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+    """
+    Greenwich mean sidereal time [rad] from the IAU-82 model.
+    Ref: Vallado, Fundamentals of Astrodynamics and Applications, Eq. 3-47
+    """
+    tut1 = ((jd - 2451545.0) + fr) / 36525.0
+    gmst_sec = (
+        67310.54841
+        + (876600.0 * 3600.0 + 8640184.812866) * tut1
+        + 0.093104 * tut1 * tut1
+        - 6.2e-6 * tut1 * tut1 * tut1
+    )
+    return np.radians(np.mod(gmst_sec, 86400.0) / 240.0)
+
+
+def teme_to_ecef_array(
+    rteme: np.ndarray,
+    jd: np.ndarray,
+    fr: np.ndarray,
+) -> np.ndarray:
+    """
+    Rotate TEME positions with shape (..., T, 3) to ECEF at times (jd, fr) with shape (T,).
+    Polar motion is neglected.
+    """
+    theta = gmst_array(jd, fr)
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    x, y, z = rteme[..., 0], rteme[..., 1], rteme[..., 2]
+    recef = np.empty_like(rteme)
+    recef[..., 0] = cos_t * x + sin_t * y
+    recef[..., 1] = -sin_t * x + cos_t * y
+    recef[..., 2] = z
+    return recef
@@ -0,0 +1,132 @@
+from math import floor
+from threading import Lock
+from time import time
+
+import numpy as np
+
+from api.settings import config
+from .geometry import R_EARTH
+from .rotations import gmst_array
+
+
+__all__ = [
+    "AU_KM",
+    "SunTable",
+    "sun_pos_ecef_array",
+    "sun_pos_ecef_interp",
+    "is_illuminated_array",
+]
+
+
+AU_KM = 149597870.700
+
+
+def sun_pos_ecef_array(jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+    """
+    Low precision sun position in ECEF [km] with shape (T, 3).
+    Ref: Vallado, Fundamentals of Astrodynamics and Applications, Algorithm 29
+    """
+    return _eci_to_ecef(sun_pos_eci_array(jd, fr), jd, fr)
+
+
+def sun_pos_eci_array(jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+    """Low precision sun position in the mean equator of date frame [km] with shape (T, 3)"""
+    tut1 = ((jd - 2451545.0) + fr) / 36525.0
+    mean_lon = np.radians(280.460 + 36000.771 * tut1)
+    mean_anomaly = np.radians(357.5291092 + 35999.05034 * tut1)
+    ecliptic_lon = mean_lon + np.radians(
+        1.914666471 * np.sin(mean_anomaly) + 0.019994643 * np.sin(2 * mean_anomaly)
+    )
+    obliquity = np.radians(23.439291 - 0.0130042 * tut1)
+    r = AU_KM * (
+        1.000140612
+        - 0.016708617 * np.cos(mean_anomaly)
+        - 0.000139589 * np.cos(2 * mean_anomaly)
+    )
+    x = r * np.cos(ecliptic_lon)
+    y = r * np.cos(obliquity) * np.sin(ecliptic_lon)
+    z = r * np.sin(obliquity) * np.sin(ecliptic_lon)
+    return np.stack((x, y, z), axis=-1)
+
+
+def _eci_to_ecef(reci: np.ndarray, jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+    theta = gmst_array(jd, fr)
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    x, y, z = reci[..., 0], reci[..., 1], reci[..., 2]
+    return np.stack((cos_t * x + sin_t * y, -sin_t * x + cos_t * y, z), axis=-1)
+
+
+class SunTable:
+    """
+    Sun positions tabulated in the inertial frame at a fixed cadence.
+    The inertial position varies slowly, so linear interpolation is accurate
+    and Earth rotation is applied exactly at lookup. Lookups are vectorized;
+    scalar callers such as `Location.sun_elevation` use `sun_pos_mjd` instead.
+    """
+
+    def __init__(self, jd0: float, days: float, step: float):
+        self.jd0 = jd0
+        self.days = days
+        t = np.arange(0, days * 86400.0 + step, step) / 86400.0
+        self.t = t
+        self.reci = sun_pos_eci_array(np.full(t.shape, jd0), t)
+
+    def covers(self, jd: np.ndarray, fr: np.ndarray) -> bool:
+        t = (jd - self.jd0) + fr
+        return bool(np.all((t >= self.t[0]) & (t <= self.t[-1])))
+
+    def sun_pos_ecef(self, jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+        t = (jd - self.jd0) + fr
+        reci = np.stack([np.interp(t, self.t, self.reci[:, i]) for i in range(3)], axis=-1)
+        return _eci_to_ecef(reci, jd, fr)
+
+
+_sun_table: SunTable | None = None
+_sun_table_lock = Lock()
+
+
+def get_sun_table() -> SunTable:
+    """
+    Shared sun table starting the UTC day before today. The table is rebuilt once
+    per day and spans the prediction horizon with a margin on both sides.
+    """
+    global _sun_table
+    jd_now = 2440587.5 + time() / 86400.0
+    day_jd0 = floor(jd_now - 0.5) + 0.5 - 1
+    table = _sun_table
+    if table is not None and table.jd0 == day_jd0:
+        return table
+    with _sun_table_lock:
+        if _sun_table is None or _sun_table.jd0 != day_jd0:
+            _sun_table = SunTable(
+                day_jd0,
+                days=config.predict.max_days + 3,
+                step=config.predict.sun_table_step,
+            )
+        return _sun_table
+
+
+def sun_pos_ecef_interp(jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+    """
+    Sun position in ECEF [km] with shape (T, 3) interpolated from the shared table.
+    Times outside of the table are computed directly.
+    """
+    jd = np.asarray(jd, dtype=np.float64)
+    fr = np.asarray(fr, dtype=np.float64)
+    if jd.size == 0:
+        return np.empty((0, 3))
+    table = get_sun_table()
+    if not table.covers(jd, fr):
+        return sun_pos_ecef_array(jd, fr)
+    return table.sun_pos_ecef(jd, fr)
+
+
+def is_illuminated_array(recef: np.ndarray, sun_recef: np.ndarray) -> np.ndarray:
+    """
+    True where satellite positions (..., 3) are outside the Earth's cylindrical shadow.
+    Sun positions must broadcast against the satellite positions.
+    """
+    sun_hat = sun_recef / np.linalg.norm(sun_recef, axis=-1, keepdims=True)
+    proj = np.sum(recef * sun_hat, axis=-1)
+    perp = np.linalg.norm(recef - proj[..., np.newaxis] * sun_hat, axis=-1)
+    return (proj > 0) | (perp > R_EARTH)
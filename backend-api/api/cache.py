@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from threading import Lock
+from time import monotonic
+from typing import Generic, TypeVar
+from uuid import UUID
+
+
+__all__ = [
+    "OrbitKeyedCache",
+]
+
+
+V = TypeVar("V")
+
+
+class OrbitKeyedCache(Generic[V]):
+    """
+    Thread-safe LRU cache with TTL for values derived from a satellite's orbit.
+
+    Entries are grouped by satellite id. When a newer orbit id is observed for a
+    satellite, every entry computed from its previous orbits is dropped.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, int, V]] = OrderedDict()
+        self._satellite_keys: dict[int, set[Hashable]] = {}
+        self._orbit_ids: dict[int, UUID] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def observe_orbit(self, satellite_id: int, orbit_id: UUID) -> None:
+        """Record the latest orbit for satellite and invalidate entries from older orbits"""
+        with self._lock:
+            previous = self._orbit_ids.get(satellite_id)
+            if previous == orbit_id:
+                return
+            self._orbit_ids[satellite_id] = orbit_id
+            if previous is not None:
+                self._invalidate(satellite_id)
+
+    def get(self, key: Hashable) -> V | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, satellite_id, value = item
+            if expires < monotonic():
+                self._pop(key, satellite_id)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, satellite_id: int, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (monotonic() + self.ttl, satellite_id, value)
+            self._data.move_to_end(key)
+            self._satellite_keys.setdefault(satellite_id, set()).add(key)
+            while len(self._data) > self.maxsize:
+                old_key, (_, old_satellite_id, _) = self._data.popitem(last=False)
+                self._satellite_keys.get(old_satellite_id, set()).discard(old_key)
+
+    def _invalidate(self, satellite_id: int) -> None:
+        for key in self._satellite_keys.pop(satellite_id, set()):
+            self._data.pop(key, None)
+
+    def _pop(self, key: Hashable, satellite_id: int) -> None:
+        self._data.pop(key, None)
+        self._satellite_keys.get(satellite_id, set()).discard(key)
@@ -1,9 +1,11 @@
 from ._base import Base
 from ._models import Satellite
 from ._models import Orbit
+from ._models import LatestOrbit
 
 __all__ = [
     "Base",
     "Satellite",
     "Orbit",
+    "LatestOrbit",
 ]
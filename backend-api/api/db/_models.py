@@ -93,6 +93,17 @@ class Orbit(Base):
     )
 
 
+class LatestOrbit(Base):
+    """Latest orbit epoch per satellite, maintained when orbits are inserted"""
+    __tablename__ = "latest_orbit"
+    satellite_id: Mapped[int] = mapped_column(ForeignKey("satellite.id"), primary_key=True)
+    orbit_id: Mapped[UUID] = mapped_column(ForeignKey("orbit.id"), nullable=False)
+    epoch: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # Increases with every write so readers can poll for changed rows in commit order
+    version: Mapped[int] = mapped_column(Integer, server_default='0', nullable=False, index=True)
+    orbit: Mapped[Orbit] = relationship()
+
+
 # Jonathan Space Report Satcat Phases/Status column descriptors
 # https://planet4589.org/space/gcat/web/intro/phases.html
 JSR_status_decayed = {
@@ -1,4 +1,6 @@
+from sqlalchemy import event, Engine
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from api.settings import config
 
@@ -8,19 +10,43 @@ __all__ = [
     "write_engine",
     "ReadSession",
     "WriteSession",
+    "set_sqlite_pragmas",
 ]
 
 
+def set_sqlite_pragmas(engine: Engine, pragmas: dict[str, str | int]) -> None:
+    """Execute PRAGMA statements on every new DBAPI connection of the engine"""
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for key, value in pragmas.items():
+            cursor.execute(f"PRAGMA {key}={value};")
+        cursor.close()
+
+
+# Bounded pool of read-only connections. In WAL mode readers never block
+# behind the writer.
 read_engine = create_async_engine(
     config.db.sqlalchemy_conn_url(read_only=True),
     echo=config.db.echo,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=config.db.read_pool_size,
+    max_overflow=0,
+    pool_timeout=config.db.read_pool_timeout,
 )
+set_sqlite_pragmas(read_engine.sync_engine, config.db.pragmas(read_only=True))
 
 
+# A single pooled connection serializes all writes from the API process
 write_engine = create_async_engine(
     config.db.sqlalchemy_conn_url(),
     echo=config.db.echo,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=1,
+    max_overflow=0,
 )
+set_sqlite_pragmas(write_engine.sync_engine, config.db.pragmas())
 
 
 ReadSession = async_sessionmaker(
@@ -33,18 +59,3 @@ WriteSession = async_sessionmaker(
     bind=write_engine,
     expire_on_commit=False,
 )
-
-
-# from sqlalchemy.engine import Engine
-# from sqlalchemy import event, Connection
-# @event.listens_for(read_conn.sync_engine, "connect")
-# def set_sqlite_wal_mode(dbapi_connection, connection_record):
-#     cursor = dbapi_connection.cursor()
-#     cursor.execute("PRAGMA journal_mode=WAL;")
-#     cursor.close()
-
-# @event.listens_for(write_conn.sync_engine, "connect")
-# def set_sqlite_wal_mode(dbapi_connection, connection_record):
-#     cursor = dbapi_connection.cursor()
-#     cursor.execute("PRAGMA journal_mode=WAL;")
-#     cursor.close()
\ No newline at end of file
@@ -1,5 +1,5 @@
 from collections.abc import Sequence
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from typing import Literal
 from uuid import UUID
 from dataclasses import dataclass, field
@@ -92,6 +92,26 @@ class Point:
         return s
 
 
+@dataclass(frozen=True)
+class RazelSteps:
+    """Columnar range [km], azimuth [deg], elevation [deg] at fixed steps from start"""
+    start: datetime
+    step: float
+    range: Sequence[float]
+    azimuth: Sequence[float]
+    elevation: Sequence[float]
+
+    def __len__(self) -> int:
+        return len(self.range)
+
+    def to_list(self) -> list[tuple[datetime, float, float, float]]:
+        delta = timedelta(seconds=self.step)
+        return [
+            (self.start + delta * n, float(rng), float(az), float(el))
+            for n, (rng, az, el) in enumerate(zip(self.range, self.azimuth, self.elevation))
+        ]
+
+
 @dataclass(frozen=True)
 class Overpass:
     aos: Point
@@ -99,6 +119,7 @@ class Overpass:
     los: Point
     norad_id: int
     dt_razel: list[Sequence[datetime, float, float, float]] = field(default_factory=list)
+    razel_steps: RazelSteps | None = None
     type: PassType | None = None
     brightness: float | None = None
     vis_begin: Point | None = None
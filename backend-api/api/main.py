@@ -1,24 +1,34 @@
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
+import multiprocessing
 from collections.abc import AsyncIterator
 from typing import TypedDict
 from importlib.resources import files as resource_files
 
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import Response, RedirectResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncEngine, AsyncSession
 
 from api.settings import config
+from api import metrics
+from api.astrodynamics.propagator import propagator_cache
+from api.passes.service import pass_cache, warm_up_worker
 import api.satellites as satellites
 import api.passes as passes
 import api.home as home
+from api.satellites.catalog import OrbitCatalog
 
 
 class State(TypedDict):
     ReadSession: async_sessionmaker[AsyncSession]
     WriteSession: async_sessionmaker
+    PredictExecutor: ProcessPoolExecutor | None
+    OrbitCatalog: OrbitCatalog | None
 
 
 @asynccontextmanager
@@ -28,11 +38,49 @@ async def lifespan(app: FastAPI) -> AsyncIterator[State]:
 
     init_logging(__name__)
 
+    # Connect the writer once so journal mode is set before readers connect
+    async with WriteSession.kw["bind"].connect():
+        pass
+
+    predict_executor = None
+    if config.predict.process_pool_size > 0:
+        predict_executor = ProcessPoolExecutor(
+            max_workers=config.predict.process_pool_size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up_worker,
+        )
+        # Start every worker and wait for its imports, so the first requests
+        # are not queued behind spawning the pool
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(predict_executor, warm_up_worker)
+            for _ in range(config.predict.process_pool_size)
+        ))
+
+    orbit_catalog, catalog_task = None, None
+    if config.catalog.enabled:
+        orbit_catalog = OrbitCatalog()
+        async with ReadSession() as db_session:
+            await orbit_catalog.refresh(db_session)
+        catalog_task = asyncio.create_task(
+            orbit_catalog.poll(
+                ReadSession,
+                config.catalog.refresh_seconds,
+                config.catalog.evict_seconds,
+            )
+        )
+
     state = {
         "ReadSession": ReadSession,
         "WriteSession": WriteSession,
+        "PredictExecutor": predict_executor,
+        "OrbitCatalog": orbit_catalog,
     }
     yield state
+    if catalog_task is not None:
+        catalog_task.cancel()
+    if predict_executor is not None:
+        predict_executor.shutdown(wait=False, cancel_futures=True)
     read_engine: AsyncEngine = ReadSession.kw["bind"]
     write_engine: AsyncEngine = WriteSession.kw["bind"]
     await asyncio.gather(read_engine.dispose(), write_engine.dispose())
@@ -74,6 +122,23 @@ app.include_router(satellites.v1_router, prefix="/api")
 app.include_router(passes.v1_router, prefix="/api")
 
 
+metrics.cache_collector({
+    "pass": pass_cache,
+    "propagator": propagator_cache,
+})
+metrics.thread_pool_collector(
+    lambda: anyio.to_thread.current_default_thread_limiter().statistics()
+)
+
+
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 # app.add_api_route(
 #     "/",
 #     home.home_page,
@@ -0,0 +1,129 @@
+from collections.abc import Callable, Iterator, Mapping
+from time import perf_counter
+
+from prometheus_client import Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+
+from api.cache import OrbitKeyedCache
+
+
+__all__ = [
+    "REQUEST_LATENCY",
+    "PASSES_PHASE_DURATION",
+    "PASSES_REQUEST_SATELLITES",
+    "PASSES_REQUEST_OVERPASSES",
+    "PREDICT_EXECUTOR_PENDING",
+    "RequestMetricsMiddleware",
+    "cache_collector",
+    "thread_pool_collector",
+]
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route, until the last byte of the body is sent",
+    ("method", "route", "status"),
+)
+
+PASSES_PHASE_DURATION = Histogram(
+    "passes_phase_duration_seconds",
+    "Time spent in each phase of a pass prediction request",
+    ("phase",),
+)
+
+PASSES_REQUEST_SATELLITES = Histogram(
+    "passes_request_satellites",
+    "Satellites per pass prediction request",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100),
+)
+
+PASSES_REQUEST_OVERPASSES = Histogram(
+    "passes_request_overpasses",
+    "Overpasses returned per pass prediction request",
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+PREDICT_EXECUTOR_PENDING = Gauge(
+    "predict_executor_pending_tasks",
+    "Pass prediction tasks submitted to the process pool and not yet finished",
+)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware observing the latency of each request under its route
+    template. The timer stops when the app returns, after a streamed body is
+    fully sent, instead of when the response headers are sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            ).observe(perf_counter() - t0)
+
+
+class _CacheCollector(Collector):
+
+    def __init__(self, caches: Mapping[str, OrbitKeyedCache]):
+        self.caches = caches
+
+    def collect(self) -> Iterator[Metric]:
+        hits = CounterMetricFamily("cache_hits", "Cache lookups that found a value", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that found no value", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Values held in the cache", labels=["cache"])
+        for name, cache in self.caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            entries.add_metric([name], len(cache))
+        yield from (hits, misses, entries)
+
+
+class _ThreadPoolCollector(Collector):
+
+    def __init__(self, statistics: Callable[[], object]):
+        self.statistics = statistics
+
+    def collect(self) -> Iterator[Metric]:
+        try:
+            stats = self.statistics()
+        except RuntimeError:
+            # No running event loop
+            return
+        yield GaugeMetricFamily("thread_pool_borrowed_tokens", "Busy worker threads", value=stats.borrowed_tokens)
+        yield GaugeMetricFamily("thread_pool_total_tokens", "Maximum worker threads", value=stats.total_tokens)
+        yield GaugeMetricFamily("thread_pool_tasks_waiting", "Tasks queued for a worker thread", value=stats.tasks_waiting)
+
+
+def cache_collector(caches: Mapping[str, OrbitKeyedCache]) -> None:
+    """Register hit, miss and size metrics of named caches"""
+    REGISTRY.register(_CacheCollector(caches))
+
+
+def thread_pool_collector(statistics: Callable[[], object]) -> None:
+    """
+    Register usage of the thread pool which runs sync routes and pass computations.
+    statistics returns the anyio CapacityLimiterStatistics of the pool.
+    """
+    REGISTRY.register(_ThreadPoolCollector(statistics))
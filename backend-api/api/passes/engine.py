@@ -0,0 +1,419 @@
+"""
+Batched pass prediction engine.
+
+All satellites are propagated together on a shared coarse time grid with NumPy.
+Horizon crossings are found from sign changes of the elevation on the grid and
+refined with a vectorized bisection, so only the brackets around AOS/LOS are
+propagated again at high resolution.
+"""
+from datetime import datetime, timedelta
+from collections.abc import Callable, Sequence
+from math import ceil, log2, radians, sqrt
+from typing import Literal
+
+import numpy as np
+
+from api import astrodynamics as astro
+from api.domain import Overpass, Point, PassType, RazelSteps
+
+
+__all__ = [
+    "compute_batch_passes",
+    "razel_step_grid",
+]
+
+
+# Extra time propagated before start and after end so passes in progress at the
+# window edges still get a proper AOS and LOS
+PASS_LEAD_SECONDS = 3600.0
+INV_GOLDEN = (sqrt(5) - 1) / 2
+# Coarse scan samples each orbit this many times per period, estimates the
+# elevation rate by finite difference, and only propagates the fine grid inside
+# intervals where a cubic Hermite fit may come within the margin of the horizon.
+# The fit only decides intervals whose two samples are below the horizon; for
+# those, LEO orbits from 11.9 to 16.2 rev/day underestimate the true peak by at
+# most 0.2 deg at 20 samples, while 10 samples miss peaks by more than 20 deg.
+# A 1 s forward difference is far below the minutes-long scale on which the
+# elevation rate changes. tests/test_engine.py checks the scan against the grid.
+COARSE_SAMPLES_PER_PERIOD = 20
+COARSE_RATE_STEP = 1.0
+COARSE_MARGIN_RAD = radians(2.0)
+
+
+TimePredicate = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+class _PassSearch:
+    """Evaluates satellite geometry at arbitrary (satellite, time offset) pairs"""
+
+    def __init__(
+        self,
+        propagators: Sequence[astro.SGP4Propagator],
+        location: astro.Location,
+        start: datetime,
+        sunrise_deg: float,
+    ):
+        self.propagators = propagators
+        self.location = location
+        self.start = start
+        self.sunrise_deg = sunrise_deg
+
+    def positions(self, sat_idx: np.ndarray, t: np.ndarray) -> np.ndarray:
+        recef = np.full((t.size, 3), np.nan)
+        jd, fr = astro.julian_date_array(self.start, t)
+        for i in np.unique(sat_idx):
+            mask = sat_idx == i
+            recef[mask] = self.propagators[i].position_ecef_array(jd[mask], fr[mask])
+        return recef
+
+    def elevation(self, sat_idx: np.ndarray, t: np.ndarray) -> np.ndarray:
+        return self.location.elevation_array(self.positions(sat_idx, t))
+
+    def razel(self, sat_idx: np.ndarray, t: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.location.razel_array(self.positions(sat_idx, t))
+
+    def sun_elevation(self, t: np.ndarray) -> np.ndarray:
+        jd, fr = astro.julian_date_array(self.start, t)
+        sun_recef = astro.sun_pos_ecef_interp(jd, fr)
+        return np.degrees(self.location.elevation_array(sun_recef))
+
+    def visible(self, sat_idx: np.ndarray, t: np.ndarray) -> np.ndarray:
+        """Satellite is illuminated while the observer is in darkness"""
+        jd, fr = astro.julian_date_array(self.start, t)
+        sun_recef = astro.sun_pos_ecef_interp(jd, fr)
+        sun_el = np.degrees(self.location.elevation_array(sun_recef))
+        illuminated = astro.is_illuminated_array(self.positions(sat_idx, t), sun_recef)
+        return illuminated & (sun_el <= self.sunrise_deg)
+
+
+def compute_batch_passes(
+    propagators: Sequence[astro.SGP4Propagator],
+    location: astro.Location,
+    start: datetime,
+    end: datetime,
+    *,
+    visible_only: bool = False,
+    aos_at_deg: float = 0,
+    sunrise_deg: float = -6,
+    razel_step: float = 60,
+    razel_columns: bool = False,
+    grid_step: float = 20,
+    tol: float = 0.1,
+    scan: Literal["grid", "coarse"] = "grid",
+) -> list[Overpass]:
+    """
+    Compute overpasses for all propagators over location at once.
+
+    Passes shorter than `grid_step` above `aos_at_deg` may be missed. AOS, LOS, TCA
+    and visibility boundaries are refined to within `tol` seconds. The "coarse"
+    scan only propagates the `grid_step` grid near possible horizon crossings.
+    """
+    if not propagators:
+        return []
+    search = _PassSearch(propagators, location, start, sunrise_deg)
+    aos_rad = radians(aos_at_deg)
+    window = (end - start).total_seconds()
+
+    # Propagate every satellite on the shared grid
+    t_grid = np.arange(-PASS_LEAD_SECONDS, window + PASS_LEAD_SECONDS + grid_step, grid_step)
+    if scan == "coarse":
+        el_grid = _coarse_elevation_grid(search, t_grid, aos_rad)
+    else:
+        jd, fr = astro.julian_date_array(start, t_grid)
+        el_grid = location.elevation_array(astro.propagate_ecef_array(propagators, jd, fr))
+    above = el_grid > aos_rad
+
+    # Bracket and refine every horizon crossing together
+    rise_sat, rise_idx = np.nonzero(~above[:, :-1] & above[:, 1:])
+    set_sat, set_idx = np.nonzero(above[:, :-1] & ~above[:, 1:])
+    n_iter = max(1, ceil(log2(grid_step / tol)))
+    t_lo = t_grid[np.concatenate((rise_idx, set_idx))]
+    t_cross = _bisect(
+        lambda s, t: search.elevation(s, t) > aos_rad,
+        np.concatenate((rise_sat, set_sat)),
+        t_lo,
+        t_lo + grid_step,
+        n_iter,
+    )
+    t_rise, t_set = t_cross[:rise_sat.size], t_cross[rise_sat.size:]
+
+    # Pair each rise with the following set of the same satellite
+    pass_sat, aos_t, los_t, aos_idx, los_idx = [], [], [], [], []
+    for i in range(len(propagators)):
+        rises, sets = rise_sat == i, set_sat == i
+        r_idx, s_idx = rise_idx[rises], set_idx[sets]
+        j = np.searchsorted(s_idx, r_idx)
+        paired = j < s_idx.size
+        pass_sat.append(np.full(np.count_nonzero(paired), i))
+        aos_t.append(t_rise[rises][paired])
+        los_t.append(t_set[sets][j[paired]])
+        aos_idx.append(r_idx[paired] + 1)
+        los_idx.append(s_idx[j[paired]])
+    pass_sat = np.concatenate(pass_sat)
+    aos_t, los_t = np.concatenate(aos_t), np.concatenate(los_t)
+    aos_idx, los_idx = np.concatenate(aos_idx), np.concatenate(los_idx)
+    in_window = (los_t > 0) & (aos_t < window)
+    pass_sat, aos_t, los_t = pass_sat[in_window], aos_t[in_window], los_t[in_window]
+    aos_idx, los_idx = aos_idx[in_window], los_idx[in_window]
+    n_passes = pass_sat.size
+    if n_passes == 0:
+        return []
+
+    # Time of closest approach, bracketed by the highest grid point of each pass
+    peak_t = np.array([
+        t_grid[a + np.argmax(el_grid[s, a:b + 1])]
+        for s, a, b in zip(pass_sat, aos_idx, los_idx)
+    ])
+    tca_t = _golden_max(
+        search.elevation,
+        pass_sat,
+        np.maximum(peak_t - grid_step, aos_t),
+        np.minimum(peak_t + grid_step, los_t),
+        tol,
+    )
+
+    # Pass type from the sun at the observer and satellite illumination. Like
+    # the observer engine, a pass is daylight only when the sun is up for all
+    # of it, so passes crossing into twilight get a visible or unlit type.
+    samples = [
+        np.concatenate(([aos_t[k]], t_grid[aos_idx[k]:los_idx[k] + 1], [los_t[k]]))
+        for k in range(n_passes)
+    ]
+    sample_sun_el = np.split(
+        search.sun_elevation(np.concatenate(samples)),
+        np.cumsum([sample.size for sample in samples])[:-1],
+    )
+    daylight = np.array([np.min(sun_el) > sunrise_deg for sun_el in sample_sun_el])
+    vis_begin_t = np.full(n_passes, np.nan)
+    vis_end_t = np.full(n_passes, np.nan)
+    night = np.flatnonzero(~daylight)
+    if night.size:
+        sample_sat = np.concatenate([np.full(samples[k].size, pass_sat[k]) for k in night])
+        sample_visible = np.split(
+            search.visible(sample_sat, np.concatenate([samples[k] for k in night])),
+            np.cumsum([samples[k].size for k in night])[:-1],
+        )
+        bracket_pass, bracket_lo, bracket_hi, bracket_begin = [], [], [], []
+        for k, visible in zip(night, sample_visible):
+            visible_idx = np.flatnonzero(visible)
+            if visible_idx.size == 0:
+                continue
+            first, last = visible_idx[0], visible_idx[-1]
+            if first == 0:
+                vis_begin_t[k] = aos_t[k]
+            else:
+                bracket_pass.append(k)
+                bracket_lo.append(samples[k][first - 1])
+                bracket_hi.append(samples[k][first])
+                bracket_begin.append(True)
+            if last == visible.size - 1:
+                vis_end_t[k] = los_t[k]
+            else:
+                bracket_pass.append(k)
+                bracket_lo.append(samples[k][last])
+                bracket_hi.append(samples[k][last + 1])
+                bracket_begin.append(False)
+        if bracket_pass:
+            bracket_pass = np.array(bracket_pass)
+            bracket_begin = np.array(bracket_begin)
+            t_vis = _bisect(
+                search.visible,
+                pass_sat[bracket_pass],
+                np.array(bracket_lo),
+                np.array(bracket_hi),
+                n_iter,
+            )
+            vis_begin_t[bracket_pass[bracket_begin]] = t_vis[bracket_begin]
+            vis_end_t[bracket_pass[~bracket_begin]] = t_vis[~bracket_begin]
+    visible = ~np.isnan(vis_begin_t) & ~np.isnan(vis_end_t)
+
+    # Visible part of the pass reaches its highest elevation at TCA or at the
+    # boundary closest to TCA since elevation is unimodal over a pass
+    vis_tca_t = np.where(
+        (vis_begin_t <= tca_t) & (tca_t <= vis_end_t),
+        tca_t,
+        np.where(vis_end_t < tca_t, vis_end_t, vis_begin_t),
+    )
+
+    # Range, azimuth, elevation for every reported point in one evaluation
+    point_t = np.concatenate((aos_t, tca_t, los_t, vis_begin_t, vis_end_t, vis_tca_t))
+    point_sat = np.tile(pass_sat, 6)
+    point_valid = ~np.isnan(point_t)
+    rng = np.full(point_t.size, np.nan)
+    az, el = rng.copy(), rng.copy()
+    rng[point_valid], az[point_valid], el[point_valid] = search.razel(point_sat[point_valid], point_t[point_valid])
+    points = [
+        _make_point(start, t, r, a, e) if valid else None
+        for t, r, a, e, valid in zip(point_t, rng, az, el, point_valid)
+    ]
+    aos_pts, tca_pts, los_pts, vis_begin_pts, vis_end_pts, vis_tca_pts = (
+        points[n * n_passes:(n + 1) * n_passes]
+        for n in range(6)
+    )
+
+    razel_steps = [None] * n_passes
+    if razel_step > 0:
+        razel_steps = _razel_steps(search, start, pass_sat, aos_pts, los_pts, razel_step)
+
+    overpasses = []
+    for k in range(n_passes):
+        if daylight[k]:
+            pass_type = PassType.DAYLIGHT
+        elif visible[k]:
+            pass_type = PassType.VISIBLE
+        else:
+            pass_type = PassType.UNLIT
+        if visible_only and pass_type != PassType.VISIBLE:
+            continue
+        overpasses.append(Overpass(
+            aos=aos_pts[k],
+            tca=tca_pts[k],
+            los=los_pts[k],
+            dt_razel=razel_steps[k].to_list() if razel_steps[k] is not None and not razel_columns else [],
+            razel_steps=razel_steps[k] if razel_columns else None,
+            norad_id=propagators[pass_sat[k]].satid,
+            type=pass_type.value,
+            vis_begin=vis_begin_pts[k] if visible[k] else None,
+            vis_end=vis_end_pts[k] if visible[k] else None,
+            vis_tca=vis_tca_pts[k] if visible[k] else None,
+        ))
+    return overpasses
+
+
+def _coarse_elevation_grid(
+    search: _PassSearch,
+    t_grid: np.ndarray,
+    aos_rad: float,
+) -> np.ndarray:
+    """
+    Elevation on t_grid for every satellite, propagating the full grid only inside
+    coarse intervals that may reach aos_rad. Skipped points are set to -90 deg,
+    below any aos_rad, so no crossing is bracketed inside a skipped interval and
+    every point of a pass, from AOS to LOS, is propagated.
+    """
+    n_points = t_grid.size
+    grid_step = t_grid[1] - t_grid[0] if n_points > 1 else 1.0
+    el_grid = np.full((len(search.propagators), n_points), -0.5 * np.pi)
+    h01 = np.linspace(0, 1, 9)
+    h00 = 1 - h01
+    # Cubic Hermite basis on 9 points inside each interval
+    b00 = (1 + 2 * h01) * h00 * h00
+    b10 = h01 * h00 * h00
+    b01 = h01 * h01 * (3 - 2 * h01)
+    b11 = -h01 * h01 * h00
+    for i, propagator in enumerate(search.propagators):
+        period = 2 * np.pi / propagator._propagator.no_kozai * 60.0
+        stride = max(1, int(period / COARSE_SAMPLES_PER_PERIOD // grid_step))
+        coarse_idx = np.unique(np.append(np.arange(0, n_points, stride), n_points - 1))
+        t_coarse = t_grid[coarse_idx]
+        sat_idx = np.full(t_coarse.size, i)
+        el = search.elevation(sat_idx, t_coarse)
+        rate = (search.elevation(sat_idx, t_coarse + COARSE_RATE_STEP) - el) / COARSE_RATE_STEP
+        h = np.diff(t_coarse)[:, np.newaxis]
+        el_fit = (
+            b00 * el[:-1, np.newaxis]
+            + b10 * h * rate[:-1, np.newaxis]
+            + b01 * el[1:, np.newaxis]
+            + b11 * h * rate[1:, np.newaxis]
+        )
+        candidate = np.flatnonzero(~(np.nanmax(el_fit, axis=1) < aos_rad - COARSE_MARGIN_RAD))
+        fine = np.zeros(n_points, dtype=bool)
+        for k in candidate:
+            fine[coarse_idx[k]:coarse_idx[k + 1] + 1] = True
+        fine[coarse_idx] = False
+        el_grid[i, coarse_idx] = el
+        if np.any(fine):
+            el_grid[i, fine] = search.elevation(np.full(np.count_nonzero(fine), i), t_grid[fine])
+    return el_grid
+
+
+def razel_step_grid(start: datetime, end: datetime, step: float) -> tuple[datetime, int]:
+    """First step datetime and number of steps covering a pass from start to end"""
+    delta = timedelta(seconds=step)
+    dt0 = start.replace(microsecond=0) - delta
+    n_steps = int(((end + delta) - dt0) // delta) + 1
+    return dt0, n_steps
+
+
+def _razel_steps(
+    search: _PassSearch,
+    start: datetime,
+    pass_sat: np.ndarray,
+    aos_pts: Sequence[Point],
+    los_pts: Sequence[Point],
+    step: float,
+) -> list[RazelSteps]:
+    """Range, azimuth, elevation at fixed steps for every pass in one evaluation"""
+    grids = [
+        razel_step_grid(aos.datetime, los.datetime, step)
+        for aos, los in zip(aos_pts, los_pts)
+    ]
+    step_sat = np.concatenate([np.full(n_steps, s) for s, (_, n_steps) in zip(pass_sat, grids)])
+    step_t = np.concatenate([
+        (dt0 - start).total_seconds() + np.arange(n_steps) * step
+        for dt0, n_steps in grids
+    ])
+    rng, az, el = search.razel(step_sat, step_t)
+    splits = np.cumsum([n_steps for _, n_steps in grids])[:-1]
+    return [
+        RazelSteps(start=dt0, step=step, range=r, azimuth=a, elevation=e)
+        for (dt0, _), r, a, e in zip(grids, np.split(rng, splits), np.split(az, splits), np.split(el, splits))
+    ]
+
+
+def _make_point(start: datetime, t: float, rng: float, az: float, el: float) -> Point:
+    return Point(
+        datetime=start + timedelta(seconds=float(t)),
+        azimuth=float(az),
+        elevation=float(el),
+        range=float(rng),
+    )
+
+
+def _bisect(
+    predicate: TimePredicate,
+    sat_idx: np.ndarray,
+    lo: np.ndarray,
+    hi: np.ndarray,
+    n_iter: int,
+) -> np.ndarray:
+    """Locate the change of predicate inside each bracket [lo, hi] simultaneously"""
+    lo, hi = lo.astype(np.float64), hi.astype(np.float64)
+    if lo.size == 0:
+        return lo
+    value_lo = predicate(sat_idx, lo)
+    for _ in range(n_iter):
+        mid = 0.5 * (lo + hi)
+        same = predicate(sat_idx, mid) == value_lo
+        lo = np.where(same, mid, lo)
+        hi = np.where(same, hi, mid)
+    return 0.5 * (lo + hi)
+
+
+def _golden_max(
+    func: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    sat_idx: np.ndarray,
+    lo: np.ndarray,
+    hi: np.ndarray,
+    tol: float,
+) -> np.ndarray:
+    """Golden section search for the maximum of func inside each bracket simultaneously"""
+    a, b = lo.astype(np.float64), hi.astype(np.float64)
+    if a.size == 0:
+        return a
+    c = b - INV_GOLDEN * (b - a)
+    d = a + INV_GOLDEN * (b - a)
+    fc, fd = func(sat_idx, c), func(sat_idx, d)
+    while np.max(b - a) > tol:
+        left = fc > fd
+        b = np.where(left, d, b)
+        a = np.where(left, a, c)
+        t_new = np.where(left, b - INV_GOLDEN * (b - a), a + INV_GOLDEN * (b - a))
+        f_new = func(sat_idx, t_new)
+        c, d, fc, fd = (
+            np.where(left, t_new, d),
+            np.where(left, c, t_new),
+            np.where(left, f_new, fd),
+            np.where(left, fc, f_new),
+        )
+    return 0.5 * (a + b)
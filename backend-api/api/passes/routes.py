@@ -1,14 +1,16 @@
 from datetime import datetime, UTC, timedelta
 import logging
+from time import perf_counter
 from typing import Annotated
 from collections.abc import AsyncIterator
 
-from fastapi import APIRouter, Depends, Request, Query
-from fastapi.concurrency import run_in_threadpool
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from api.settings import config
 from api import domain
+from api import metrics
 from api.satellites import service as satellite_service
 from . import schemas
 from . import service
@@ -35,14 +37,18 @@ async def get_read_session(request: Request) -> AsyncIterator[AsyncSession]:
     response_model_exclude_unset=True,
 )
 async def get_passes(
+    request: Request,
     params: Annotated[schemas.OverpassQuery, Depends()],
     db_session: Annotated[AsyncSession, Depends(get_read_session)],
 ):
     # Get satellite and orbit objects
+    t0 = perf_counter()
     satellites = await satellite_service.query_latest_satellite_orbit(
         db_session=db_session,
         norad_ids=params.norad_ids,
+        catalog=request.state.OrbitCatalog,
     )
+    t1 = perf_counter()
     # TODO: Emit warning if orbit epoch is greater than 7 days old
 
     # Compute passes
@@ -53,18 +59,136 @@ async def get_passes(
         longitude=params.longitude,
         height=params.height,
     )
-    overpasses = await run_in_threadpool(
-        service.compute_passes,
-        satellites=satellites,
-        location=location,
-        start=start,
-        end=end,
+    timings = service.PredictTimings()
+    overpasses = await service.predict_passes(
+        satellites,
+        location,
+        start,
+        end,
+        executor=request.state.PredictExecutor,
+        timings=timings,
+        razel_columns=params.razel_format == "columns",
+        precision=params.precision,
     )
-    result = {
-        "location": location,
-        "satellites": satellites,
-        "overpasses": overpasses,
-        "start": start,
-        "end": end,
+    t2 = perf_counter()
+    # Validate and serialize here instead of through response_model so the
+    # time of each is measured
+    result = schemas.OverpassResult.model_validate(
+        {
+            "location": location,
+            "satellites": satellites,
+            "overpasses": overpasses,
+            "start": start,
+            "end": end,
+        },
+        from_attributes=True,
+    )
+    t3 = perf_counter()
+    phases = {
+        "db": t1 - t0,
+        "queue": timings.queue,
+        "compute": timings.compute,
+        "validate": t3 - t2,
     }
-    return result
+    if params.debug:
+        result.debug = _debug_timings(phases, timings, satellites)
+    content = result.model_dump_json(exclude_unset=True)
+    phases["serialize"] = perf_counter() - t3
+    for phase, seconds in phases.items():
+        metrics.PASSES_PHASE_DURATION.labels(phase=phase).observe(seconds)
+    metrics.PASSES_REQUEST_SATELLITES.observe(len(satellites))
+    metrics.PASSES_REQUEST_OVERPASSES.observe(len(overpasses))
+    return Response(
+        content,
+        media_type="application/json",
+        headers={"Server-Timing": _server_timing(phases)},
+    )
+
+
+def _server_timing(phases: dict[str, float]) -> str:
+    return ", ".join(f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in phases.items())
+
+
+def _debug_timings(
+    phases: dict[str, float],
+    timings: service.PredictTimings,
+    satellites: list[domain.Satellite],
+) -> schemas.DebugTimings:
+    """Timings of every requested satellite, slowest first, including cache hits"""
+    propagation = timings.propagation
+    satellite_timings = [
+        schemas.SatelliteTiming(
+            norad_id=satellite.norad_id,
+            propagation_ms=propagation.seconds.get(satellite.norad_id, 0.0) * 1000,
+            evaluations=propagation.evaluations.get(satellite.norad_id, 0),
+            cache_hit=satellite.norad_id in timings.cache_hits,
+        )
+        for satellite in satellites
+    ]
+    satellite_timings.sort(key=lambda timing: -timing.propagation_ms)
+    return schemas.DebugTimings(
+        phases_ms={phase: seconds * 1000 for phase, seconds in phases.items()},
+        satellites=satellite_timings,
+    )
+
+
+@v1_router.get(
+    '/stream',
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def stream_passes(
+    request: Request,
+    params: Annotated[schemas.OverpassQuery, Depends()],
+    db_session: Annotated[AsyncSession, Depends(get_read_session)],
+    merge: Annotated[
+        bool,
+        Query(description="Merge satellites to keep overpasses in AOS order"),
+    ] = True,
+):
+    """
+    Stream overpasses as newline-delimited JSON records. Passes are computed the
+    same way as for /passes, in chunks of the window per satellite, and sent as
+    soon as their chunk is computed. With merge, a pass is held until every
+    satellite has been computed past its AOS.
+    """
+    if params.debug:
+        # Timings are only known after the headers are sent
+        raise HTTPException(status_code=400, detail="debug is not supported when streaming")
+    t0 = perf_counter()
+    satellites = await satellite_service.query_latest_satellite_orbit(
+        db_session=db_session,
+        norad_ids=params.norad_ids,
+        catalog=request.state.OrbitCatalog,
+    )
+    phases = {"db": perf_counter() - t0}
+    metrics.PASSES_PHASE_DURATION.labels(phase="db").observe(phases["db"])
+    metrics.PASSES_REQUEST_SATELLITES.observe(len(satellites))
+    start = datetime.now(UTC)
+    end = start + timedelta(days=params.days)
+    location = domain.Location(
+        latitude=params.latitude,
+        longitude=params.longitude,
+        height=params.height,
+    )
+    overpasses = service.stream_passes(
+        satellites,
+        location,
+        start,
+        end,
+        merge=merge,
+        executor=request.state.PredictExecutor,
+        razel_columns=params.razel_format == "columns",
+        precision=params.precision,
+    )
+
+    async def gen_records() -> AsyncIterator[str]:
+        async for overpass in overpasses:
+            record = schemas.Overpass.model_validate(overpass, from_attributes=True)
+            yield record.model_dump_json(exclude_unset=True) + "\n"
+
+    return StreamingResponse(
+        gen_records(),
+        media_type="application/x-ndjson",
+        headers={"Server-Timing": _server_timing(phases)},
+    )
@@ -3,12 +3,15 @@ from typing import Annotated, Literal
 from functools import partial
 from math import ceil
 
+import numpy as np
 from fastapi import Query
 from pydantic import (
     BaseModel,
     Field,
     computed_field,
+    model_validator,
     AfterValidator,
+    BeforeValidator,
     PlainSerializer,
 )
 
@@ -26,6 +29,11 @@ def format_milli(d: datetime) -> str:
 
 FormatMilliseconds = PlainSerializer(format_milli, return_type=str, when_used="json-unless-none")
 
+def round_array2(value):
+    return np.round(np.asarray(value, dtype=np.float64), 2).tolist()
+
+FloatArrayRound2 = Annotated[list[float], BeforeValidator(round_array2)]
+
 
 class Point(BaseModel):
     datetime: Annotated[datetime, FormatMilliseconds]
@@ -35,6 +43,14 @@ class Point(BaseModel):
     # brightness: Annotated[float | None, Field(description='brightness magnitude')] = None
 
 
+class RazelSteps(BaseModel):
+    start: Annotated[datetime, Field(description='Datetime of the first step'), FormatMilliseconds]
+    step: Annotated[float, Field(description='Seconds between steps')]
+    range: Annotated[FloatArrayRound2, Field(description='range [km]')]
+    azimuth: Annotated[FloatArrayRound2, Field(description='azimuth [deg]')]
+    elevation: Annotated[FloatArrayRound2, Field(description='elevation [deg]')]
+
+
 class Overpass(BaseModel):
     aos: Annotated[Point, Field(description='Acquisition of signal')]
     tca: Annotated[Point, Field(description='Time of closest approach')]
@@ -46,6 +62,17 @@ class Overpass(BaseModel):
     # brightness: float = None
     vis_begin: Annotated[Point | None, Field(description='Satellite visibility begins')] = None
     vis_end: Annotated[Point | None, Field(description='Satellite visibility ends')] = None
+    razel_steps: Annotated[RazelSteps | None, Field(description="Columnar range, azimuth, elevation steps when razel_format=columns")] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def drop_unused_razel_format(cls, data):
+        # Leave the field of the format not chosen unset so responses, which
+        # exclude unset fields, carry either dt_razel or razel_steps
+        if not isinstance(data, dict):
+            data = {name: getattr(data, name) for name in cls.model_fields if hasattr(data, name)}
+        unused = "razel_steps" if data.get("razel_steps") is None else "dt_razel"
+        return {k: v for k, v in data.items() if k != unused}
 
     @computed_field(description='Duration of pass [sec]')
     @property
@@ -60,12 +87,25 @@ class Location(BaseModel):
     height: Annotated[float, Field(0.0, description='Location height above WGS84 ellipsoid [m]'), Round2]
 
 
+class SatelliteTiming(BaseModel):
+    norad_id: int
+    propagation_ms: Annotated[float, Field(description='Wall-clock time propagating the satellite [ms]'), Round2]
+    evaluations: Annotated[int, Field(description='Number of SGP4 evaluations')]
+    cache_hit: Annotated[bool, Field(description='Overpasses were served from the pass cache without computing')]
+
+
+class DebugTimings(BaseModel):
+    phases_ms: Annotated[dict[str, FloatRound2], Field(description='Wall-clock time of each request phase [ms]')]
+    satellites: list[SatelliteTiming] = []
+
+
 class OverpassResult(BaseModel):
     location: Location
     satellites: list[Satellite]
     overpasses: list[Overpass]
     start: Annotated[datetime, FormatMilliseconds]
     end: Annotated[datetime, FormatMilliseconds]
+    debug: Annotated[DebugTimings | None, Field(description="Phase timings, only with debug=true")] = None
 
     @computed_field
     @property
@@ -97,9 +137,24 @@ class OverpassQuery:
             float,
             Query(gt=0, le=config.predict.max_days, description="Number of days to predict overpasses"),
         ] = config.predict.max_days,
+        razel_format: Annotated[
+            Literal["tuples", "columns"],
+            Query(description="Return dt_razel as (datetime, range, azimuth, elevation) tuples or razel_steps as parallel arrays"),
+        ] = "tuples",
+        precision: Annotated[
+            Literal["high", "low"],
+            Query(description="AOS/LOS precision tier, high is 0.1 s and low is 1 s with a coarse scan"),
+        ] = "high",
+        debug: Annotated[
+            bool,
+            Query(description="Include phase timings and propagation per satellite in the response"),
+        ] = False,
     ):
         self.norad_ids = norad_ids
         self.latitude = round(float(latitude), 6)
         self.longitude = round(float(longitude), 6)
         self.height = round(float(height), 6)
         self.days = days
+        self.razel_format = razel_format
+        self.precision = precision
+        self.debug = debug
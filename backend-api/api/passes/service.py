@@ -1,11 +1,346 @@
+import asyncio
+import heapq
+from concurrent.futures import Executor
 from datetime import datetime, timedelta
-from collections.abc import Iterable, Iterator, Sequence
-from typing import cast
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import chain, count
+from math import floor
+from time import perf_counter
+from typing import cast, Literal, NamedTuple
+from uuid import UUID
 
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from api.settings import config
 from api import astrodynamics as astro
-from api.domain import Overpass, Point, Satellite, Location
+from api.astrodynamics import geometry
+from api.domain import Overpass, Point, Satellite, Location, Orbit, RazelSteps
+from .engine import compute_batch_passes, razel_step_grid
+from api.cache import OrbitKeyedCache
+from api import metrics
+
+
+class OrbitElements(NamedTuple):
+    """Compact orbit tuple sent to worker processes instead of a domain.Satellite graph"""
+    norad_id: int
+    name: str | None
+    satellite_id: int
+    epoch: datetime
+    inclination: float
+    eccentricity: float
+    ra_of_asc_node: float
+    arg_of_pericenter: float
+    mean_anomaly: float
+    bstar: float
+    mean_motion: float
+    mean_motion_dot: float
+    mean_motion_ddot: float
+    orbit_id: UUID | None = None
+
+    @classmethod
+    def from_satellite(cls, satellite: Satellite) -> 'OrbitElements':
+        orbit = satellite.orbits[0]
+        return cls(
+            norad_id=satellite.norad_id,
+            name=satellite.name,
+            satellite_id=orbit.satellite_id,
+            epoch=orbit.epoch,
+            inclination=orbit.inclination,
+            eccentricity=orbit.eccentricity,
+            ra_of_asc_node=orbit.ra_of_asc_node,
+            arg_of_pericenter=orbit.arg_of_pericenter,
+            mean_anomaly=orbit.mean_anomaly,
+            bstar=orbit.bstar,
+            mean_motion=orbit.mean_motion,
+            mean_motion_dot=orbit.mean_motion_dot,
+            mean_motion_ddot=orbit.mean_motion_ddot,
+            orbit_id=orbit.id,
+        )
+
+    def to_satellite(self) -> Satellite:
+        orbit = Orbit(
+            satellite_id=self.satellite_id,
+            epoch=self.epoch,
+            inclination=self.inclination,
+            eccentricity=self.eccentricity,
+            ra_of_asc_node=self.ra_of_asc_node,
+            arg_of_pericenter=self.arg_of_pericenter,
+            mean_anomaly=self.mean_anomaly,
+            bstar=self.bstar,
+            mean_motion=self.mean_motion,
+            mean_motion_dot=self.mean_motion_dot,
+            mean_motion_ddot=self.mean_motion_ddot,
+            id=self.orbit_id,
+        )
+        return Satellite(
+            norad_id=self.norad_id,
+            intl_designator="",
+            name=self.name,
+            id=self.satellite_id,
+            orbits=[orbit],
+        )
+
+
+class PassCacheKey(NamedTuple):
+    orbit_id: UUID
+    latitude: float
+    longitude: float
+    height: float
+    bucket_start: datetime
+    duration: float
+    aos_at_deg: float
+    sunrise_deg: float
+    visible_only: bool
+    razel_step: float
+    razel_columns: bool
+    precision: str
+
+
+pass_cache = OrbitKeyedCache[list[Overpass]](
+    maxsize=config.predict.cache_size,
+    ttl=config.predict.cache_ttl,
+)
+
+
+def quantize_request(
+    location: Location,
+    start: datetime,
+    end: datetime,
+) -> tuple[Location, datetime, datetime]:
+    """
+    Snap location to the cache grid and start to the time bucket. The returned
+    window covers the original one so cached passes can be filtered to it.
+    """
+    grid = config.predict.cache_location_grid
+    height_grid = config.predict.cache_height_grid
+    bucket = config.predict.cache_time_bucket
+    cache_location = Location(
+        latitude=round(round(location.latitude / grid) * grid, 6),
+        longitude=round(round(location.longitude / grid) * grid, 6),
+        height=round(location.height / height_grid) * height_grid,
+    )
+    bucket_start = datetime.fromtimestamp(
+        floor(start.timestamp() / bucket) * bucket,
+        tz=start.tzinfo,
+    )
+    bucket_end = bucket_start + (end - start) + timedelta(seconds=bucket)
+    return cache_location, bucket_start, bucket_end
+
+
+@dataclass
+class PredictTimings:
+    """Wall-clock seconds of the compute phases of predict_passes"""
+    queue: float = 0.0   # waiting for a worker thread or process
+    compute: float = 0.0
+    propagation: astro.PropagationStats = field(default_factory=astro.PropagationStats)
+    cache_hits: set[int] = field(default_factory=set)   # NORAD ids served from the pass cache
+
+
+async def predict_passes(
+    satellites: Sequence[Satellite],
+    location: Location,
+    start: datetime,
+    end: datetime,
+    *,
+    executor: Executor | None = None,
+    timings: PredictTimings | None = None,
+    visible_only: bool = False,
+    aos_at_deg: float = 0,
+    sunrise_deg: float = -6,
+    razel_step: float = 60,
+    razel_columns: bool = False,
+    precision: str = "high",
+) -> list[Overpass]:
+    """
+    Compute overpasses through the pass cache. Satellites that miss the cache are
+    computed in the executor if given, otherwise in the thread pool. Phase times
+    and propagation per satellite are added to timings if given.
+
+    Cache keys use the latest orbit id, so an orbit inserted by InsertOrbitBatch
+    is picked up by the next query and evicts results from the older orbit.
+    """
+    params = dict(
+        visible_only=visible_only,
+        aos_at_deg=aos_at_deg,
+        sunrise_deg=sunrise_deg,
+        razel_step=razel_step,
+        razel_columns=razel_columns,
+        precision=precision,
+    )
+    if config.predict.cache_size <= 0:
+        return await _compute_passes_async(executor, timings, satellites, location, start, end, **params)
+    cache_location, bucket_start, bucket_end = quantize_request(location, start, end)
+    overpasses: list[Overpass] = []
+    misses: dict[int, PassCacheKey | None] = {}
+    for satellite in satellites:
+        orbit = satellite.orbits[0]
+        if orbit.id is None:
+            misses[satellite.norad_id] = None
+            continue
+        pass_cache.observe_orbit(orbit.satellite_id, orbit.id)
+        key = PassCacheKey(
+            orbit_id=orbit.id,
+            latitude=cache_location.latitude,
+            longitude=cache_location.longitude,
+            height=cache_location.height,
+            bucket_start=bucket_start,
+            duration=(end - start).total_seconds(),
+            aos_at_deg=aos_at_deg,
+            sunrise_deg=sunrise_deg,
+            visible_only=visible_only,
+            razel_step=razel_step,
+            razel_columns=razel_columns,
+            precision=precision,
+        )
+        cached = pass_cache.get(key)
+        if cached is None:
+            misses[satellite.norad_id] = key
+        else:
+            overpasses.extend(cached)
+            if timings is not None:
+                timings.cache_hits.add(satellite.norad_id)
+    if misses:
+        missing_satellites = [sat for sat in satellites if sat.norad_id in misses]
+        computed = await _compute_passes_async(
+            executor,
+            timings,
+            missing_satellites,
+            cache_location,
+            bucket_start,
+            bucket_end,
+            **params,
+        )
+        by_norad_id = {norad_id: [] for norad_id in misses}
+        for overpass in computed:
+            by_norad_id[overpass.norad_id].append(overpass)
+        for satellite in missing_satellites:
+            if (key := misses[satellite.norad_id]) is not None:
+                pass_cache.set(key, satellite.orbits[0].satellite_id, by_norad_id[satellite.norad_id])
+        overpasses.extend(computed)
+    overpasses = [
+        overpass for overpass in overpasses
+        if overpass.los.datetime >= start and overpass.aos.datetime <= end
+    ]
+    overpasses.sort(key=lambda op: op.aos.datetime)
+    return overpasses
+
+
+async def _compute_passes_async(
+    executor: Executor | None,
+    timings: PredictTimings | None,
+    satellites: Sequence[Satellite],
+    location: Location,
+    start: datetime,
+    end: datetime,
+    **kwargs,
+) -> list[Overpass]:
+    if executor is not None:
+        return await compute_passes_in_executor(
+            executor, satellites, location, start, end, timings=timings, **kwargs,
+        )
+    if timings is None:
+        return await run_in_threadpool(
+            compute_passes,
+            satellites=satellites,
+            location=location,
+            start=start,
+            end=end,
+            **kwargs,
+        )
+    submitted = perf_counter()
+
+    def compute_timed() -> list[Overpass]:
+        started = perf_counter()
+        with astro.record_propagation(timings.propagation):
+            overpasses = compute_passes(satellites, location, start, end, **kwargs)
+        timings.queue += started - submitted
+        timings.compute += perf_counter() - started
+        return overpasses
+
+    return await run_in_threadpool(compute_timed)
 
 
+async def compute_passes_in_executor(
+    executor: Executor,
+    satellites: Iterable[Satellite],
+    location: Location,
+    start: datetime,
+    end: datetime,
+    *,
+    timings: PredictTimings | None = None,
+    **kwargs,
+) -> list[Overpass]:
+    """Fan out pass predictions to the executor, one satellite per task, and merge results"""
+    loop = asyncio.get_running_loop()
+    func = compute_orbit_passes if timings is None else compute_orbit_passes_timed
+    submitted = perf_counter()
+    tasks = []
+    for satellite in satellites:
+        task = loop.run_in_executor(
+            executor,
+            partial(
+                func,
+                [OrbitElements.from_satellite(satellite)],
+                location,
+                start,
+                end,
+                **kwargs,
+            ),
+        )
+        metrics.PREDICT_EXECUTOR_PENDING.inc()
+        task.add_done_callback(lambda _: metrics.PREDICT_EXECUTOR_PENDING.dec())
+        tasks.append(task)
+    results = await asyncio.gather(*tasks)
+    if timings is not None:
+        # Tasks run in parallel, so time not spent in the slowest task is queueing
+        wall = perf_counter() - submitted
+        compute = max((seconds for _, seconds, _ in results), default=0.0)
+        timings.compute += compute
+        timings.queue += max(wall - compute, 0.0)
+        for _, _, stats in results:
+            timings.propagation.merge(stats)
+        results = [overpasses for overpasses, _, _ in results]
+    overpasses = list(chain.from_iterable(results))
+    overpasses.sort(key=lambda op: op.aos.datetime)
+    return overpasses
+
+
+def compute_orbit_passes(
+    orbits: Sequence[OrbitElements],
+    location: Location,
+    start: datetime,
+    end: datetime,
+    **kwargs,
+) -> list[Overpass]:
+    """Compute overpasses from compact orbit tuples. Entry point for worker processes."""
+    satellites = [elements.to_satellite() for elements in orbits]
+    return compute_passes(satellites, location, start, end, **kwargs)
+
+
+def compute_orbit_passes_timed(
+    orbits: Sequence[OrbitElements],
+    location: Location,
+    start: datetime,
+    end: datetime,
+    **kwargs,
+) -> tuple[list[Overpass], float, astro.PropagationStats]:
+    """Like compute_orbit_passes, also returning compute seconds and propagation stats"""
+    t0 = perf_counter()
+    with astro.record_propagation() as stats:
+        overpasses = compute_orbit_passes(orbits, location, start, end, **kwargs)
+    return overpasses, perf_counter() - t0, stats
+
+
+
+def warm_up_worker() -> None:
+    """
+    No-op for worker processes. Unpickling it imports this module, and with it
+    numpy, passpredict and the batch engine, before the first prediction.
+    """
+
 def compute_passes(
     satellites: Iterable[Satellite],
     location: Location,
@@ -15,8 +350,19 @@ def compute_passes(
     aos_at_deg: float = 0,
     sunrise_deg: float = -6,
     razel_step: float = 60,
+    razel_columns: bool = False,
+    precision: str = "high",
+    engine: Literal["batch", "observer"] = config.predict.engine,
 ) -> list[Overpass]:
-    """Compute overpasses for satellites over location"""
+    """
+    Compute overpasses for satellites over location
+
+    The "batch" engine propagates all satellites together with NumPy arrays,
+    the "observer" engine walks each satellite serially with `astro.Observer`.
+    With `razel_columns`, steps are returned in `Overpass.razel_steps` instead
+    of as `dt_razel` tuples. `precision` selects a tier from
+    `config.predict.precision_tiers` for the batch engine.
+    """
     loc = astro.Location(
         latitude_deg=location.latitude,
         longitude_deg=location.longitude,
@@ -24,21 +370,144 @@ def compute_passes(
         name=location.name,
     )
     overpasses = cast(list[Overpass], [])
-    it = compute_pass_iterator(
-        satellites,
-        loc,
-        start,
-        end,
-        visible_only=visible_only,
-        aos_at_deg=aos_at_deg,
-        sunrise_deg=sunrise_deg,
-        razel_step=razel_step,
-    )
-    overpasses = list(it)
+    satellites = filter_visible_satellites(satellites, location, aos_at_deg)
+    if engine == "batch":
+        tier = config.predict.precision_tiers[precision]
+        propagators = [
+            astro.get_propagator(orbit=satellite.orbits[0], satellite=satellite)
+            for satellite in satellites
+        ]
+        overpasses = compute_batch_passes(
+            propagators,
+            loc,
+            start,
+            end,
+            visible_only=visible_only,
+            aos_at_deg=aos_at_deg,
+            sunrise_deg=sunrise_deg,
+            razel_step=razel_step,
+            razel_columns=razel_columns,
+            grid_step=config.predict.batch_grid_step,
+            tol=tier.tol,
+            scan=tier.scan,
+        )
+    else:
+        it = compute_pass_iterator(
+            satellites,
+            loc,
+            start,
+            end,
+            visible_only=visible_only,
+            aos_at_deg=aos_at_deg,
+            sunrise_deg=sunrise_deg,
+            razel_step=razel_step,
+            razel_columns=razel_columns,
+        )
+        overpasses = list(it)
     overpasses.sort(key=lambda op: op.aos.datetime)
     return overpasses
 
 
+def filter_visible_satellites(
+    satellites: Iterable[Satellite],
+    location: Location,
+    aos_at_deg: float,
+) -> list[Satellite]:
+    """Drop satellites whose inclination and apogee prove they can never rise at location"""
+    visible = []
+    for satellite in satellites:
+        orbit = satellite.orbits[0]
+        apogee = orbit.apogee
+        if apogee is None:
+            apogee = geometry.apogee_altitude(orbit.mean_motion, orbit.eccentricity)
+        if geometry.may_be_visible(location.latitude, orbit.inclination, apogee, aos_at_deg):
+            visible.append(satellite)
+    return visible
+
+
+# Merged streams hold passes rising this close to the time a satellite has been
+# computed up to, since its next chunk may report a pass at the boundary a
+# fraction of a second earlier than the chunk before did
+STREAM_MERGE_SLACK = timedelta(seconds=60)
+
+
+async def stream_passes(
+    satellites: Sequence[Satellite],
+    location: Location,
+    start: datetime,
+    end: datetime,
+    *,
+    merge: bool = True,
+    executor: Executor | None = None,
+    chunk_seconds: float = config.predict.stream_chunk_seconds,
+    **kwargs,
+) -> AsyncIterator[Overpass]:
+    """
+    Yield overpasses while they are computed. Each satellite runs as its own task,
+    predicting the window in consecutive chunks through predict_passes, so the
+    engine, pass cache and executor are the same as for a full response.
+
+    Without `merge`, overpasses are yielded as soon as their chunk is computed.
+    With `merge`, they are yielded in AOS order: an overpass is sent once every
+    unfinished satellite has been computed past its AOS.
+    """
+    chunk = timedelta(seconds=chunk_seconds)
+    queue: asyncio.Queue[tuple[int, list[Overpass], datetime | None] | Exception] = asyncio.Queue()
+
+    async def predict_chunks(satellite: Satellite):
+        chunk_start, last_los = start, None
+        try:
+            while True:
+                chunk_end = min(chunk_start + chunk, end)
+                last = chunk_end >= end
+                overpasses = await predict_passes(
+                    [satellite], location, chunk_start, chunk_end, executor=executor, **kwargs,
+                )
+                # A pass crossing the end of a chunk belongs to the chunk it
+                # rises in. The next chunk skips it by its LOS, which also keeps a
+                # pass rising within the tolerance of the boundary exactly once.
+                overpasses = [
+                    op for op in overpasses
+                    if (last_los is None or op.aos.datetime > last_los)
+                    and (last or op.aos.datetime < chunk_end)
+                ]
+                if overpasses:
+                    last_los = overpasses[-1].los.datetime
+                await queue.put((satellite.norad_id, overpasses, None if last else chunk_end))
+                if last:
+                    return
+                chunk_start = chunk_end
+        except Exception as exc:
+            await queue.put(exc)
+
+    tasks = [asyncio.create_task(predict_chunks(satellite)) for satellite in satellites]
+    # Time each unfinished satellite has been computed up to
+    computed_until = {satellite.norad_id: start for satellite in satellites}
+    heap: list[tuple[datetime, int, Overpass]] = []
+    order = count()
+    try:
+        while computed_until:
+            item = await queue.get()
+            if isinstance(item, Exception):
+                raise item
+            norad_id, overpasses, until = item
+            if until is None:
+                del computed_until[norad_id]
+            else:
+                computed_until[norad_id] = until
+            if not merge:
+                for overpass in overpasses:
+                    yield overpass
+                continue
+            for overpass in overpasses:
+                heapq.heappush(heap, (overpass.aos.datetime, next(order), overpass))
+            horizon = min(computed_until.values(), default=None)
+            while heap and (horizon is None or heap[0][0] < horizon - STREAM_MERGE_SLACK):
+                yield heapq.heappop(heap)[2]
+    finally:
+        for task in tasks:
+            task.cancel()
+
 def compute_pass_iterator(
     satellites: Iterable[Satellite],
     location: astro.Location,
@@ -48,10 +517,11 @@ def compute_pass_iterator(
     aos_at_deg: float,
     sunrise_deg: float,
     razel_step: float,
+    razel_columns: bool = False,
 ) -> Iterator[Overpass]:
     for satellite in satellites:
         orbit = satellite.orbits[0]
-        propagator = astro.SGP4Propagator(orbit=orbit, satellite=satellite)
+        propagator = astro.get_propagator(orbit=orbit, satellite=satellite)
         observer = astro.Observer(location=location, satellite=propagator)
         predicted_passes = observer.iter_passes(
             start_date=start,
@@ -63,20 +533,23 @@ def compute_pass_iterator(
         for predicted_pass in predicted_passes:
             aos_pt = make_point(predicted_pass.aos)
             los_pt = make_point(predicted_pass.los)
+            razel_steps, dt_razel = None, []
             if razel_step > 0:
-                dt_razel = compute_razel_steps(
-                    observer,
+                razel_steps = compute_razel_steps(
+                    propagator,
+                    location,
                     aos_pt.datetime,
                     los_pt.datetime,
                     razel_step,
                 )
-            else:
-                dt_razel = []
+                if not razel_columns:
+                    dt_razel, razel_steps = razel_steps.to_list(), None
             overpass = Overpass(
                 aos=aos_pt,
                 tca=make_point(predicted_pass.tca),
                 los=los_pt,
                 dt_razel=dt_razel,
+                razel_steps=razel_steps,
                 norad_id=satellite.norad_id,
                 type=predicted_pass.type.value.upper(),
                 vis_begin=make_point(predicted_pass.vis_begin),
@@ -87,22 +560,17 @@ def compute_pass_iterator(
 
 
 def compute_razel_steps(
-    observer: astro.Observer,
+    propagator: astro.SGP4Propagator,
+    location: astro.Location,
     start: datetime,
     end: datetime,
     step: float,
-) -> list[tuple[datetime, float, float, float]]:
-    delta = timedelta(seconds=step)
-    dt = start.replace(microsecond=0) - delta
-
-    def gen():
-        nonlocal dt
-        while dt <= end + delta:
-            razel = observer.razel(dt)
-            yield (dt, razel.range, razel.az, razel.el)
-            dt += delta
-
-    return list(gen())
+) -> RazelSteps:
+    """Range, azimuth, elevation at every step of a pass from a single array propagation"""
+    dt0, n_steps = razel_step_grid(start, end, step)
+    jd, fr = astro.julian_date_array(dt0, np.arange(n_steps) * step)
+    rng, az, el = location.razel_array(propagator.position_ecef_array(jd, fr))
+    return RazelSteps(start=dt0, step=step, range=rng, azimuth=az, elevation=el)
 
 
 def make_point(pass_point: astro.PassPoint | None) -> Point | None:
@@ -0,0 +1,202 @@
+import asyncio
+from datetime import date, datetime
+import logging
+from time import monotonic
+from typing import NamedTuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api import db
+from api import domain
+
+
+__all__ = [
+    "OrbitCatalog",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+# Column order of the element array
+ELEMENT_COLUMNS = (
+    "inclination",
+    "eccentricity",
+    "ra_of_asc_node",
+    "arg_of_pericenter",
+    "mean_anomaly",
+    "bstar",
+    "mean_motion",
+    "mean_motion_dot",
+    "mean_motion_ddot",
+    "perigee",
+    "apogee",
+)
+
+
+class CatalogRow(NamedTuple):
+    norad_id: int
+    satellite_id: int
+    orbit_id: UUID
+    epoch: datetime
+    name: str | None
+    intl_designator: str | None
+    launch_date: date | None
+
+
+class OrbitCatalog:
+    """
+    Latest orbital elements of all non-decayed satellites held in memory.
+
+    Elements are stored in one float array with a row per satellite, and the
+    few non-numeric fields in parallel lists. The catalog is loaded once and then
+    refreshed incrementally from latest_orbit rows with a version above the
+    highest one already seen. Satellites that decay or lose their latest orbit
+    are evicted by comparing against the full set of live satellites.
+    """
+
+    def __init__(self, initial_capacity: int = 32768):
+        self.elements = np.full((initial_capacity, len(ELEMENT_COLUMNS)), np.nan)
+        self.rows: list[CatalogRow] = []
+        self.index: dict[int, int] = {}
+        self.last_version: int | None = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, norad_id: int) -> domain.Satellite | None:
+        i = self.index.get(norad_id)
+        if i is None:
+            return None
+        row = self.rows[i]
+        values = dict(zip(ELEMENT_COLUMNS, self.elements[i].tolist()))
+        for key in ("perigee", "apogee"):
+            if np.isnan(values[key]):
+                values[key] = None
+        orbit = domain.Orbit(
+            id=row.orbit_id,
+            satellite_id=row.satellite_id,
+            epoch=row.epoch,
+            **values,
+        )
+        return domain.Satellite(
+            id=row.satellite_id,
+            norad_id=norad_id,
+            intl_designator=row.intl_designator,
+            name=row.name,
+            launch_date=row.launch_date,
+            orbits=[orbit],
+        )
+
+    def lookup(self, norad_ids: list[int]) -> tuple[list[domain.Satellite], list[int]]:
+        """Return satellites found in the catalog and the norad ids that are missing"""
+        satellites, missing = [], []
+        for norad_id in norad_ids:
+            satellite = self.get(norad_id)
+            if satellite is None:
+                missing.append(norad_id)
+            else:
+                satellites.append(satellite)
+        return satellites, missing
+
+    def upsert(self, orbit: db.Orbit, satellite: db.Satellite) -> None:
+        i = self.index.get(satellite.norad_id)
+        if i is not None and self.rows[i].epoch >= orbit.epoch:
+            return
+        row = CatalogRow(
+            norad_id=satellite.norad_id,
+            satellite_id=satellite.id,
+            orbit_id=orbit.id,
+            epoch=orbit.epoch,
+            name=satellite.name,
+            intl_designator=satellite.intl_designator,
+            launch_date=satellite.launch_date,
+        )
+        if i is None:
+            i = len(self.rows)
+            if i >= self.elements.shape[0]:
+                grown = np.full((2 * self.elements.shape[0], len(ELEMENT_COLUMNS)), np.nan)
+                grown[:i] = self.elements
+                self.elements = grown
+            self.rows.append(row)
+            self.index[satellite.norad_id] = i
+        else:
+            self.rows[i] = row
+        self.elements[i] = [
+            np.nan if (value := getattr(orbit, column)) is None else value
+            for column in ELEMENT_COLUMNS
+        ]
+
+    def remove(self, norad_id: int) -> None:
+        """Drop a satellite by moving the last row into its place"""
+        i = self.index.pop(norad_id, None)
+        if i is None:
+            return
+        last = len(self.rows) - 1
+        if i != last:
+            row = self.rows[last]
+            self.rows[i] = row
+            self.elements[i] = self.elements[last]
+            self.index[row.norad_id] = i
+        self.rows.pop()
+        self.elements[last] = np.nan
+
+    async def refresh(self, db_session: AsyncSession) -> int:
+        """Load latest orbits written after the previous refresh. Returns rows updated."""
+        stmt = (
+            select(db.Orbit, db.Satellite, db.LatestOrbit.version)
+            .join(db.LatestOrbit, db.LatestOrbit.orbit_id == db.Orbit.id)
+            .join(db.Satellite, db.Satellite.id == db.LatestOrbit.satellite_id)
+            .where(db.Satellite.decay_date.is_(None))
+        )
+        if self.last_version is not None:
+            stmt = stmt.where(db.LatestOrbit.version > self.last_version)
+        results = await db_session.execute(stmt)
+        count = 0
+        last_version = self.last_version or 0
+        for orbit, satellite, version in results:
+            self.upsert(orbit, satellite)
+            last_version = max(last_version, version)
+            count += 1
+        self.last_version = last_version
+        return count
+
+    async def evict(self, db_session: AsyncSession) -> int:
+        """Remove satellites that decayed or no longer have a latest orbit. Returns rows removed."""
+        stmt = (
+            select(db.Satellite.norad_id)
+            .join(db.LatestOrbit, db.LatestOrbit.satellite_id == db.Satellite.id)
+            .where(db.Satellite.decay_date.is_(None))
+        )
+        live = set((await db_session.scalars(stmt)).all())
+        stale = self.index.keys() - live
+        for norad_id in stale:
+            self.remove(norad_id)
+        return len(stale)
+
+    async def poll(
+        self,
+        Session: async_sessionmaker[AsyncSession],
+        interval: float,
+        evict_interval: float,
+    ) -> None:
+        """Refresh the catalog forever every interval seconds, evicting every evict_interval seconds"""
+        last_evict = monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with Session() as db_session:
+                    count = await self.refresh(db_session)
+                    removed = 0
+                    if monotonic() - last_evict >= evict_interval:
+                        removed = await self.evict(db_session)
+                        last_evict = monotonic()
+                if count:
+                    logger.info(f"Orbit catalog refreshed {count} satellites")
+                if removed:
+                    logger.info(f"Orbit catalog evicted {removed} satellites")
+            except Exception:
+                logger.exception("Error refreshing orbit catalog")
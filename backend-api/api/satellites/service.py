@@ -10,6 +10,7 @@ from api.settings import config
 from api import db
 from api import domain
 from .schemas import SatelliteQueryFilter
+from .catalog import OrbitCatalog
 
 
 class SatelliteServiceError(Exception):
@@ -205,29 +206,47 @@ async def query_latest_satellite_orbit(
     db_session: AsyncSession,
     norad_ids: list[int],
     originators: list[str] | None = None,
+    catalog: OrbitCatalog | None = None,
 ) -> list[domain.Satellite]:
-    """Query latest orbits for satellites and embed satellite details"""
-    orbit_a = aliased(db.Orbit)
-    stmt = (
-        select(
-            orbit_a.id.label("orbit_id"),
-            func.max(orbit_a.epoch),
-        )
-        .group_by(orbit_a.satellite_id)
-        .join(orbit_a.satellite)
-        .where(db.Satellite.norad_id.in_(norad_ids))
-    )
+    """
+    Query latest orbits for satellites and embed satellite details.
+    Without an originator filter, satellites are read from the in-memory catalog
+    when given, and the rest are looked up through the latest_orbit table.
+    """
+    cached_satellites = []
+    if catalog is not None and not originators:
+        cached_satellites, norad_ids = catalog.lookup(list(norad_ids))
+        if not norad_ids:
+            return cached_satellites
     if originators:
-        stmt = stmt.where(orbit_a.originator.in_(originators))
-    subq = stmt.subquery()
-    stmt = (
-        select(db.Orbit)
-        .join(subq, db.Orbit.id == subq.c.orbit_id)
-        .options(selectinload(db.Orbit.satellite))
-    )
+        orbit_a = aliased(db.Orbit)
+        stmt = (
+            select(
+                orbit_a.id.label("orbit_id"),
+                func.max(orbit_a.epoch),
+            )
+            .group_by(orbit_a.satellite_id)
+            .join(orbit_a.satellite)
+            .where(db.Satellite.norad_id.in_(norad_ids))
+            .where(orbit_a.originator.in_(originators))
+        )
+        subq = stmt.subquery()
+        stmt = (
+            select(db.Orbit)
+            .join(subq, db.Orbit.id == subq.c.orbit_id)
+            .options(selectinload(db.Orbit.satellite))
+        )
+    else:
+        stmt = (
+            select(db.Orbit)
+            .join(db.LatestOrbit, db.LatestOrbit.orbit_id == db.Orbit.id)
+            .join(db.Satellite, db.Satellite.id == db.LatestOrbit.satellite_id)
+            .where(db.Satellite.norad_id.in_(norad_ids))
+            .options(selectinload(db.Orbit.satellite))
+        )
     results = await db_session.scalars(stmt)
     # Remap database orbit models to satellite domain objects
-    satellites = [
+    satellites = cached_satellites + [
         _build_satellite_domain_model(orbit.satellite, [orbit])
         for orbit in results
     ]
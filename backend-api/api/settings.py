@@ -63,6 +63,47 @@ class DbConfig(BaseModel):
     scheme: str = "sqlite+aiosqlite"
     path: Path = API_ROOT_DIR.joinpath("ppapi.db")
     echo: bool = False
+    journal_mode: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] = "WAL"
+    synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    mmap_size: int = 268435456   # bytes
+    cache_size: int = -65536   # pages, or KiB if negative
+    temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    auto_vacuum: Literal["NONE", "FULL", "INCREMENTAL"] = "INCREMENTAL"
+    busy_timeout: int = 5000   # milliseconds
+    read_pool_size: int = 4
+    read_pool_timeout: float = 30
+    worker_pool_size: int = 2
+    bulk_cache_size: int = -262144   # pages, or KiB if negative
+    bulk_wal_autocheckpoint: int = 10000   # pages
+    bulk_busy_timeout: int = 60000   # milliseconds
+
+    def pragmas(self, read_only: bool = False, bulk: bool = False) -> dict[str, str | int]:
+        """
+        PRAGMA statements for new connections. Auto vacuum, journal mode and
+        synchronous are only set by writers since auto vacuum and WAL mode are
+        persistent in the database file. Auto vacuum only takes effect on a new
+        database, existing ones are converted by a migration.
+        Bulk writers use a larger page cache, checkpoint less often and wait
+        longer for the write lock.
+        """
+        pragmas = {
+            "mmap_size": self.mmap_size,
+            "cache_size": self.cache_size,
+            "temp_store": self.temp_store,
+            "busy_timeout": self.busy_timeout,
+        }
+        if read_only:
+            pragmas["query_only"] = "ON"
+        else:
+            # Must precede journal_mode to take effect on a new database
+            pragmas["auto_vacuum"] = self.auto_vacuum
+            pragmas["journal_mode"] = self.journal_mode
+            pragmas["synchronous"] = self.synchronous
+            if bulk:
+                pragmas["cache_size"] = self.bulk_cache_size
+                pragmas["busy_timeout"] = self.bulk_busy_timeout
+                pragmas["wal_autocheckpoint"] = self.bulk_wal_autocheckpoint
+        return pragmas
 
     @computed_field
     @property
@@ -98,6 +139,7 @@ class SpacetrackConfig(BaseModel):
     base_url: str = "https://www.space-track.org"
     auth_endpoint: str = "/ajaxauth/login"
     http_timeout: float = 30
+    stream_chunk_size: int = 65536
     gp_fetch: FetchConfig = FetchConfig(
         key="spacetrack-gp-request",
         cron="17 4,12,20 * * *",
@@ -159,10 +201,44 @@ class LoggingConfig(BaseModel):
     filename: Path = Path("api.log")
 
 
+class PrecisionTier(BaseModel):
+    tol: float   # AOS/LOS tolerance in seconds
+    scan: Literal["grid", "coarse"] = "grid"
+
+
 class PredictConfig(BaseModel):
     dt_seconds: int = 1
     max_days: int = 10
     max_satellites: int = 10
+    engine: Literal["batch", "observer"] = "batch"
+    batch_grid_step: float = 20
+    precision_tiers: dict[str, PrecisionTier] = {
+        "high": PrecisionTier(tol=0.1, scan="grid"),
+        "low": PrecisionTier(tol=1.0, scan="coarse"),
+    }
+    process_pool_size: int = 0   # 0 computes passes in the thread pool instead
+    cache_size: int = 4096   # 0 disables the pass cache
+    cache_ttl: float = 3600
+    cache_location_grid: float = 0.01   # degrees
+    cache_height_grid: float = 100   # meters
+    cache_time_bucket: float = 300   # seconds
+    propagator_cache_size: int = 1024   # 0 disables the propagator cache
+    sun_table_step: float = 3600   # seconds
+    stream_chunk_seconds: float = 21600   # window predicted per step of a streamed satellite
+
+
+class CatalogConfig(BaseModel):
+    enabled: bool = True
+    refresh_seconds: float = 60
+    evict_seconds: float = 3600
+
+
+class RetentionConfig(BaseModel):
+    cron: str = "37 3 * * *"
+    keep_recent: int = 10
+    history_interval_days: float = 1
+    batch_size: int = 2000
+    vacuum_pages: int = 0   # 0 frees every page on the freelist
 
 
 class PaginateConfig(BaseModel):
@@ -176,8 +252,15 @@ class Settings(BaseSettings):
     hatchet: HatchetConfig = HatchetConfig()
     spacetrack: SpacetrackConfig = SpacetrackConfig()
     paginate: PaginateConfig = PaginateConfig()
+    catalog: CatalogConfig = CatalogConfig()
+    retention: RetentionConfig = RetentionConfig()
     debug: bool = False
     orbit_insert_batch: int = 500
+    orbit_filter_batch: int = 2000
+    orbit_insert_in_flight: int = 4   # 1 waits for each batch before spawning the next
+    # Directory for payloads passed between workflow steps. Every worker that runs
+    # the ingest workflows must mount the same directory.
+    blob_dir: Path | None = None
     static_dir: Path = API_ROOT_DIR.joinpath("static")
     template_dir: Path = API_ROOT_DIR.joinpath("templates")
 
@@ -1,15 +1,32 @@
 from hatchet_sdk import RateLimitDuration
+from sqlalchemy import create_engine, Engine
+from sqlalchemy.pool import QueuePool
 
 from api.settings import config
+from api.db.session import set_sqlite_pragmas
 from .client import hatchet
 from .workflows import (
     FetchCelestrakOrbits,
     CelestrakOrbitRequest,
     FetchSpacetrackOrbits,
     InsertOrbitBatch,
+    CompactOrbits,
 )
 
 
+def create_worker_engine() -> Engine:
+    """Long-lived engine shared by all workflow steps of the worker, tuned for bulk writes"""
+    engine = create_engine(
+        config.db.sqlalchemy_conn_url(sync=True),
+        echo=config.db.echo,
+        poolclass=QueuePool,
+        pool_size=config.db.worker_pool_size,
+        max_overflow=0,
+    )
+    set_sqlite_pragmas(engine, config.db.pragmas(bulk=True))
+    return engine
+
+
 def start():
     for fetch_config in (config.spacetrack.gp_fetch, config.spacetrack.satcat_fetch):
         hatchet.admin.put_rate_limit(
@@ -20,10 +37,15 @@ def start():
     worker = hatchet.worker(name="passpredict-api-worker")
     # worker.register_workflow(FetchCelestrakOrbits())
     # worker.register_workflow(CelestrakOrbitRequest())
+    engine = create_worker_engine()
     worker.register_workflow(FetchSpacetrackOrbits(
         username=config.spacetrack.username,
         password=config.spacetrack.password.get_secret_value(),
+        engine=engine,
     ))
-    sync_db_url = config.db.sqlalchemy_conn_url(sync=True)
-    worker.register_workflow(InsertOrbitBatch(db_url=sync_db_url))
-    worker.start()
\ No newline at end of file
+    worker.register_workflow(InsertOrbitBatch(engine=engine))
+    worker.register_workflow(CompactOrbits(engine=engine))
+    try:
+        worker.start()
+    finally:
+        engine.dispose()
\ No newline at end of file
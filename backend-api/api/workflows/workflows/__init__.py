@@ -1,3 +1,4 @@
 from .insert_orbits import InsertOrbitBatch
 from .celestrak import FetchCelestrakOrbits, CelestrakOrbitRequest
-from .spacetrack import FetchSpacetrackOrbits
\ No newline at end of file
+from .spacetrack import FetchSpacetrackOrbits
+from .retention import CompactOrbits
@@ -0,0 +1,129 @@
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+from typing import Self
+from uuid import uuid4
+
+from pydantic import BaseModel
+
+from api.settings import config
+
+
+__all__ = [
+    "BlobIntegrityError",
+    "BlobRef",
+    "BlobWriter",
+    "BlobStore",
+    "blob_store",
+]
+
+
+class BlobIntegrityError(Exception):
+    """Blob content does not match the digest of its reference"""
+
+
+class BlobRef(BaseModel):
+    """Reference to a byte range of a blob"""
+    name: str
+    digest: str   # SHA-256 of the whole blob
+    offset: int = 0
+    length: int | None = None   # None reads to the end of the blob
+
+    def range(self, offset: int, length: int) -> 'BlobRef':
+        return self.model_copy(update={"offset": self.offset + offset, "length": length})
+
+
+class BlobWriter:
+    """
+    File-like writer which hashes content as it is written. The blob is renamed
+    to a unique name when the writer is closed, so blobs with equal content are
+    separate files that each run deletes on its own.
+    """
+
+    def __init__(self, store: 'BlobStore'):
+        self.store = store
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.ref: BlobRef | None = None
+        self._file = tempfile.NamedTemporaryFile(
+            dir=store.root, prefix=".tmp-", delete=False,
+        )
+
+    def write(self, data: bytes) -> int:
+        self.hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> BlobRef:
+        if self.ref is None:
+            self._file.close()
+            ref = BlobRef(name=uuid4().hex, digest=self.hash.hexdigest(), length=self.size)
+            os.replace(self._file.name, self.store.path(ref))
+            self.ref = ref
+        return self.ref
+
+    def discard(self) -> None:
+        self._file.close()
+        Path(self._file.name).unlink(missing_ok=True)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class BlobStore:
+    """
+    Files passed between workflow steps by reference. Steps pass small BlobRefs
+    through Hatchet instead of inline payloads, so every worker that runs the
+    steps must mount the same root directory. Each blob is owned by the run
+    that wrote it, which deletes it when done.
+    """
+
+    def __init__(self, root: Path | None):
+        self._root = None if root is None else Path(root)
+
+    @property
+    def root(self) -> Path:
+        if self._root is None:
+            raise RuntimeError("blob_dir must be set to a directory shared by all workers")
+        return self._root
+
+    def path(self, ref: BlobRef) -> Path:
+        return self.root.joinpath(ref.name)
+
+    def writer(self) -> BlobWriter:
+        self.root.mkdir(parents=True, exist_ok=True)
+        return BlobWriter(self)
+
+    def put(self, data: bytes) -> BlobRef:
+        with self.writer() as writer:
+            writer.write(data)
+        return writer.ref
+
+    def read(self, ref: BlobRef) -> bytes:
+        """
+        Read only the referenced byte range. The digest is checked when the
+        reference covers the whole blob.
+        """
+        with open(self.path(ref), "rb") as f:
+            f.seek(ref.offset)
+            data = f.read() if ref.length is None else f.read(ref.length)
+            whole = ref.offset == 0 and f.read(1) == b""
+        if whole and hashlib.sha256(data).hexdigest() != ref.digest:
+            raise BlobIntegrityError(f"Blob {ref.name} does not match digest {ref.digest}")
+        return data
+
+    def delete(self, ref: BlobRef) -> None:
+        self.path(ref).unlink(missing_ok=True)
+
+
+blob_store = BlobStore(config.blob_dir)
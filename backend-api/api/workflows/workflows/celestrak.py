@@ -1,12 +1,18 @@
+import asyncio
+from collections import deque
+from collections.abc import Callable
 from datetime import datetime, UTC
 import logging
-from itertools import chain, batched
-from typing import cast, Any
+import json
+from typing import Any
 
 import httpx
 from hatchet_sdk import Context
 
+from api.settings import config
 from ..client import hatchet
+from .blobs import BlobRef, BlobWriter, blob_store
+from .dedup import OrbitDeduplicator
 
 
 __all__ = [
@@ -30,6 +36,7 @@ DEFAULT_CELESTRAK_GROUPS = (
     'goes',
 )
 DEFAULT_CELESTRAK_TIMEOUT = 30
+DEFAULT_CELESTRAK_CONCURRENCY = 4
 DEFAULT_SPACETRACK_BASE_URL = "https://www.space-track.org"
 DEFAULT_SPACETRACK_TIMEOUT = 30
 DEFAULT_SPACETRACK_EPOCH_DAYS_SINCE = 3
@@ -51,63 +58,119 @@ class FetchCelestrakOrbits:
         self.celestrak_base_url = celestrak_base_url
         self.celestrak_groups = celestrak_groups
         self.batch_count = batch_count
+        # ETag and Last-Modified headers of each group from the last inserted download
+        self.validators: dict[str, dict[str, str]] = {}
 
-    @hatchet.step()
+    @hatchet.step(retries=3, backoff_factor=2)
     async def download_orbit_data(self, context: Context):
-        """Async fetch orbit data from celestrak"""
+        """
+        Fetch all groups from celestrak concurrently through one keep-alive client.
+        Each response is passed to the dedup stage as soon as it arrives.
+        """
         input_ = context.workflow_input()
         timeout = input_.get("timeout", DEFAULT_CELESTRAK_TIMEOUT)
-        groups = input_.get("groups", DEFAULT_CELESTRAK_GROUPS)
-        orbit_data = []
-        for group in groups:
-            request_workflow = await context.aio.spawn_workflow(
-                "CelestrakOrbitRequest",
-                {
-                    "base_url": self.celestrak_base_url,
-                    "endpoint": "",
-                    "timeout": timeout,
-                    "params": {
-                        "GROUP": group,
-                        "FORMAT": "JSON",
-                    },
-                },
-            )
-            workflow_result = await request_workflow.result()
-            orbit_data.extend(workflow_result["orbit_data"])
+        groups = input_.get("groups", self.celestrak_groups)
+        concurrency = input_.get("concurrency", DEFAULT_CELESTRAK_CONCURRENCY)
+        semaphore = asyncio.Semaphore(concurrency)
+        headers = {'user-agent': 'api.passpredict.com'}
+        dedup = OrbitDeduplicator()
+        group_status = {}
+        validators = {}
+        # Unique orbits are written as insert batches to JSON lines of one blob as
+        # each group arrives. The insert step passes each child a reference to
+        # the byte range of its batch instead of the orbit data.
+        batch_ranges = []
+        pending = []
+
+        def write_batch(writer: BlobWriter, orbits: list[dict[str, Any]]):
+            line = json.dumps({"orbits": orbits}).encode() + b"\n"
+            batch_ranges.append((writer.size, len(line)))
+            writer.write(line)
+
+        with blob_store.writer() as writer:
+            async with httpx.AsyncClient(
+                base_url=self.celestrak_base_url,
+                headers=headers,
+                follow_redirects=True,
+                timeout=timeout,
+                limits=httpx.Limits(max_keepalive_connections=concurrency),
+            ) as client:
+
+                async def fetch(group: str):
+                    async with semaphore:
+                        return group, await fetch_celestrak_group(
+                            client,
+                            group,
+                            validators=self.validators.get(group),
+                            log=context.log,
+                        )
+
+                # Groups are deduplicated in the order they are listed, so each
+                # duplicate is credited to the same group on every run. A group
+                # arriving early waits until all groups before it are added.
+                tasks = [asyncio.create_task(fetch(group)) for group in groups]
+                arrived = {}
+                next_group = 0
+                for task in asyncio.as_completed(tasks):
+                    group, result = await task
+                    arrived[group] = result
+                    while next_group < len(groups) and groups[next_group] in arrived:
+                        group = groups[next_group]
+                        next_group += 1
+                        status, data, group_validators = arrived.pop(group)
+                        for orbit in dedup.add(group, data):
+                            pending.append(orbit)
+                            if len(pending) >= self.batch_count:
+                                write_batch(writer, pending)
+                                pending = []
+                        group_status[group] = {
+                            "status": status,
+                            "count": len(data),
+                            "duplicates": dedup.duplicates[group],
+                        }
+                        if group_validators:
+                            validators[group] = group_validators
+            if pending:
+                write_batch(writer, pending)
+        context.log(
+            f"Downloaded {len(dedup)} unique orbits, "
+            f"{dedup.duplicates.total()} duplicates across groups ("
+            + ", ".join(f"{group}: {dedup.duplicates[group]}" for group in groups)
+            + ")"
+        )
         queried_at = datetime.now(UTC)
         return {
-            "orbit_data": orbit_data,
+            "blob": writer.ref.model_dump(),
+            "batches": batch_ranges,
+            "groups": group_status,
+            "validators": validators,
             "queried_at": queried_at.isoformat(),
         }
 
     @hatchet.step(parents=["download_orbit_data"])
-    def parse_orbit_data(self, context: Context):
-        orbit_data = cast(
-            list[list[dict[str, Any]]],
-            context.step_output("download_orbit_data")["orbit_data"],
-        )
-        unique_orbit_data = {
-            tuple(sorted(orbit.items()))
-            for orbit in chain.from_iterable(orbit_data)
-        }
-        return {"unique_orbit_data": list(unique_orbit_data)}
-
-    @hatchet.step(parents=["download_orbit_data", "parse_orbit_data"])
     async def insert_orbits_to_database(self, context: Context):
-        unique_orbit_data = context.step_output("parse_orbit_data")["unique_orbit_data"]
-        queried_at = context.step_output("download_orbit_data")["queried_at"]
-        # batch orbit updates and insert synchronously
+        download_output = context.step_output("download_orbit_data")
+        blob = BlobRef.model_validate(download_output["blob"])
+        # Spawn insert batches with a bounded number in flight. The
+        # InsertOrbitBatch concurrency key serializes the writes.
         results = {"new_orbits": []}
-        for orbits in batched(unique_orbit_data, self.batch_count):
-            insert_workflow = await context.aio.spawn_workflow(
-                "InsertOrbitBatch",
-                {
-                    "orbits": orbits,
-                    "queried_at": queried_at,
-                },
-            )
-            workflow_result = await insert_workflow.result()
-            results["new_orbits"].extend(workflow_result["new_orbits"])
+        in_flight = deque()
+        try:
+            for offset, length in download_output["batches"]:
+                in_flight.append(await context.aio.spawn_workflow(
+                    "InsertOrbitBatch",
+                    {"blob": blob.range(offset, length).model_dump()},
+                ))
+                if len(in_flight) >= config.orbit_insert_in_flight:
+                    workflow_result = await in_flight.popleft().result()
+                    results["new_orbits"].extend(workflow_result["new_orbits"])
+            while in_flight:
+                workflow_result = await in_flight.popleft().result()
+                results["new_orbits"].extend(workflow_result["new_orbits"])
+        finally:
+            blob_store.delete(blob)
+        # Only skip unchanged groups next time once their orbits are stored
+        self.validators.update(download_output["validators"])
         return results
 
 
@@ -119,7 +182,6 @@ class CelestrakOrbitRequest:
         input_ = context.workflow_input()
         params = input_["params"]
         base_url = input_.get("base_url", DEFAULT_CELESTRAK_BASE_URL)
-        endpoint = input_.get("endpoint", "")
         timeout = input_.get("timeout", DEFAULT_CELESTRAK_TIMEOUT)
         headers = {'user-agent': 'api.passpredict.com'}
         async with httpx.AsyncClient(
@@ -128,29 +190,62 @@ class CelestrakOrbitRequest:
             follow_redirects=True,
             timeout=timeout,
         ) as client:
-            try:
-                response = await client.get(endpoint, params=params)
-            except Exception as exc:
-                context.log(
-                    "HTTP request error downloading orbits from celestrak, "
-                    f"group '{params["GROUP"]}', {repr(exc)}"
-                )
-                raise exc
-        if response.status_code >= 400:
-            # Log response error and return nothing
-            context.log(
-                "Bad HTTP response downloading orbits from celestrak, "
-                f"group '{params["GROUP"]}', {response.text}"
-            )
-            return {}
-        try:
-            data = response.json()
-        except Exception as exc:
-            # Log exception and continue
-            context.log(
-                "Error parsing orbit response from celestrak, "
-                f"group '{params["GROUP"]}', {str(exc)}, "
-                f"text: {response.text}"
-            )
+            status, data, _ = await fetch_celestrak_group(client, params["GROUP"], log=context.log)
+        if status != "ok":
             return {}
         return {"orbit_data": data}
+
+
+async def fetch_celestrak_group(
+    client: httpx.AsyncClient,
+    group: str,
+    *,
+    validators: dict[str, str] | None = None,
+    log: Callable[[str], Any] = logger.info,
+) -> tuple[str, list[dict[str, Any]], dict[str, str]]:
+    """
+    Request one celestrak group as JSON. Conditional request headers are sent
+    from the validators of a previous response so unchanged groups are skipped.
+    Returns the status, the orbit records, and the validators of this response.
+    """
+    params = {"GROUP": group, "FORMAT": "JSON"}
+    headers = {}
+    if validators:
+        if etag := validators.get("etag"):
+            headers["if-none-match"] = etag
+        if last_modified := validators.get("last-modified"):
+            headers["if-modified-since"] = last_modified
+    try:
+        response = await client.get("", params=params, headers=headers)
+    except Exception as exc:
+        log(
+            "HTTP request error downloading orbits from celestrak, "
+            f"group '{group}', {repr(exc)}"
+        )
+        raise exc
+    if response.status_code == 304:
+        log(f"Celestrak group '{group}' not modified, skipping")
+        return "not-modified", [], {}
+    if response.status_code >= 400:
+        # Log response error and return nothing
+        log(
+            "Bad HTTP response downloading orbits from celestrak, "
+            f"group '{group}', {response.text}"
+        )
+        return "error", [], {}
+    try:
+        data = response.json()
+    except Exception as exc:
+        # Log exception and continue
+        log(
+            "Error parsing orbit response from celestrak, "
+            f"group '{group}', {str(exc)}, "
+            f"text: {response.text}"
+        )
+        return "error", [], {}
+    response_validators = {
+        key: response.headers[key]
+        for key in ("etag", "last-modified")
+        if key in response.headers
+    }
+    return "ok", data, response_validators
@@ -0,0 +1,36 @@
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+
+__all__ = [
+    "OrbitDeduplicator",
+]
+
+
+class OrbitDeduplicator:
+    """
+    Drop repeated OMM records across overlapping groups as they stream in. Records
+    are keyed on (NORAD_CAT_ID, EPOCH, ORIGINATOR), the fields of the orbit
+    unique constraint, so only a small tuple is kept per unique orbit. A repeated
+    record is counted as a duplicate of the group it is added with, so groups
+    must be added in a fixed order for the counts to be reproducible.
+    """
+
+    def __init__(self):
+        self.keys: set[tuple[int, str, str | None]] = set()
+        self.duplicates: Counter[str] = Counter()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, group: str, records: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """Yield the records of a group not seen before and count the duplicates"""
+        keys = self.keys
+        for record in records:
+            key = (int(record["NORAD_CAT_ID"]), record["EPOCH"], record.get("ORIGINATOR"))
+            if key in keys:
+                self.duplicates[group] += 1
+                continue
+            keys.add(key)
+            yield record
@@ -1,23 +1,28 @@
-from collections.abc import Iterator
 from datetime import datetime, date, UTC
+from time import perf_counter
 from uuid import UUID
 import logging
-from typing import Literal, cast, Any, Annotated
+from typing import Literal, NamedTuple, cast, Any, Annotated
 
-from hatchet_sdk import Context
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import selectinload, Session
+from hatchet_sdk import Context, ConcurrencyExpression, ConcurrencyLimitStrategy
+from sqlalchemy import select, func, Engine
+from sqlalchemy.orm import Session
 from sqlalchemy.dialects.sqlite import insert
 
 
-from pydantic import BaseModel, ConfigDict, AfterValidator, BeforeValidator
+from pydantic import BaseModel, ConfigDict, AfterValidator, BeforeValidator, computed_field, model_validator
 
 from api import db
 from ..client import hatchet
+from .blobs import BlobRef, blob_store
 
 
 __all__ = [
     "InsertOrbitBatch",
+    "OrbitColumns",
+    "OrbitKey",
+    "orbit_key",
+    "query_known_orbit_keys",
 ]
 
 
@@ -78,8 +83,85 @@ class Orbit(BaseModel):
     model_config = ConfigDict(extra="ignore")
 
 
+TzAwareDatetime = Annotated[datetime, AfterValidator(ensure_tz_aware)]
+
+
+class OrbitColumns(BaseModel):
+    """
+    A batch of orbits as parallel columns. Each column is validated as one typed
+    list by pydantic-core instead of building a model per orbit.
+    """
+    norad_id: list[int]
+    intl_designator: list[Annotated[str | None, BeforeValidator(spacetrack_unknown_tba_is_null)]]
+    name: list[Annotated[str | None, BeforeValidator(spacetrack_unknown_tba_is_null)]]
+    launch_date: list[date | None]
+    epoch: list[TzAwareDatetime]
+    inclination: list[float]
+    eccentricity: list[float]
+    ra_of_asc_node: list[float]
+    arg_of_pericenter: list[float]
+    mean_anomaly: list[float]
+    bstar: list[float]
+    mean_motion: list[float]
+    mean_motion_dot: list[float]
+    mean_motion_ddot: list[float]
+    rev_at_epoch: list[int | None]
+    originator: list[str | None]
+    originator_created_at: list[TzAwareDatetime | None]
+    perigee: list[float | None]
+    apogee: list[float | None]
+    time_system: list[str | None]
+    ref_frame: list[str | None]
+    mean_element_theory: list[str | None]
+    element_set_no: list[int | None]
+    ephemeris_type: list[Literal["0", "SGP", "SGP4", "SDP4", "SGP8", "SDP8"] | None]
+    tle: list[str | None]
+    downloaded_at: TzAwareDatetime | None = None
+
+    @model_validator(mode="after")
+    def check_column_lengths(self) -> 'OrbitColumns':
+        lengths = {len(getattr(self, column)) for column in ORBIT_COLUMNS}
+        if len(lengths) > 1:
+            raise ValueError("Orbit columns have different lengths")
+        return self
+
+    def __len__(self) -> int:
+        return len(self.norad_id)
+
+    def to_rows(self) -> tuple[dict[int, dict[str, Any]], list[dict[str, Any]]]:
+        """Return satellite fields by NORAD id and orbit rows keyed by NORAD id"""
+        satellites = {}
+        for norad_id, intl_designator, name, launch_date in zip(
+            self.norad_id, self.intl_designator, self.name, self.launch_date,
+        ):
+            satellites.setdefault(norad_id, {
+                "intl_designator": intl_designator,
+                "name": name,
+                "launch_date": launch_date,
+            })
+        columns = [getattr(self, column) for column in ORBIT_ROW_COLUMNS]
+        orbit_rows = []
+        for values in zip(self.norad_id, *columns):
+            row = dict(zip(ORBIT_ROW_COLUMNS, values[1:]))
+            row["norad_id"] = values[0]
+            row["downloaded_at"] = self.downloaded_at
+            orbit_rows.append(row)
+        return satellites, orbit_rows
+
+
+ORBIT_COLUMNS = tuple(
+    name for name in OrbitColumns.model_fields if name != "downloaded_at"
+)
+ORBIT_ROW_COLUMNS = tuple(
+    name for name in ORBIT_COLUMNS
+    if name not in ("norad_id", "intl_designator", "name", "launch_date")
+)
+
+
 class InsertOrbitBatchInput(BaseModel):
-    orbits: list[Orbit]
+    orbits: list[Orbit] = []
+    columns: OrbitColumns | None = None
+    blob: BlobRef | None = None   # JSON encoded batch stored by reference
 
 
 class NewOrbit(BaseModel):
@@ -93,94 +175,226 @@ class NewOrbit(BaseModel):
 
 class InsertOrbitBatchOutput(BaseModel):
     new_orbits: list[NewOrbit]
+    orbit_count: int = 0
+    duration: float = 0   # seconds
 
+    @computed_field
+    @property
+    def orbits_per_second(self) -> float:
+        return self.orbit_count / self.duration if self.duration > 0 else 0.0
 
+
+# SQLite allows one writer, so every batch shares a single concurrency key.
+# Batches spawned while another is inserting wait in the Hatchet queue.
 @hatchet.workflow(
     input_validator=InsertOrbitBatchInput,
+    concurrency=ConcurrencyExpression(
+        expression="'orbit-writer'",
+        max_runs=1,
+        limit_strategy=ConcurrencyLimitStrategy.GROUP_ROUND_ROBIN,
+    ),
 )
 class InsertOrbitBatch:
 
     def __init__(
         self,
-        db_url: str,
+        engine: Engine,
     ):
-        self.db_url = db_url
+        self.engine = engine
+        # NORAD id to satellite id map shared by all batches run by this worker
+        self.satellite_ids: dict[int, SatelliteRef] = {}
 
     @hatchet.step()
     def insert_orbits(self, context: Context) -> InsertOrbitBatchOutput:
         input_ = cast(InsertOrbitBatchInput, context.workflow_input())
-        engine = create_engine(self.db_url)
-        with Session(bind=engine, expire_on_commit=False) as db_session:
-            with db_session.begin():
-                new_orbits = batch_insert_orbits(db_session, input_.orbits)
+        t0 = perf_counter()
+        if input_.blob is not None:
+            input_ = InsertOrbitBatchInput.model_validate_json(blob_store.read(input_.blob))
+        try:
+            with Session(bind=self.engine, expire_on_commit=False) as db_session:
+                with db_session.begin():
+                    new_orbits = []
+                    if input_.orbits:
+                        new_orbits += batch_insert_orbits(db_session, input_.orbits, self.satellite_ids)
+                    if input_.columns is not None:
+                        new_orbits += batch_insert_orbit_columns(db_session, input_.columns, self.satellite_ids)
+        except Exception:
+            # Satellite ids resolved in a rolled back transaction may not exist
+            self.satellite_ids.clear()
+            raise
+        output = InsertOrbitBatchOutput(
+            new_orbits=new_orbits,
+            orbit_count=len(input_.orbits) + len(input_.columns or ()),
+            duration=perf_counter() - t0,
+        )
+        context.log(
+            f"Inserted {len(new_orbits)} of {output.orbit_count} orbits in "
+            f"{output.duration:.3f} sec, {output.orbits_per_second:.0f} orbits/sec"
+        )
+        return output
+
 
-        return InsertOrbitBatchOutput(new_orbits=new_orbits)
+class SatelliteRef(NamedTuple):
+    id: int
+    name: str | None
 
 
 def batch_insert_orbits(
     db_session: Session,
     orbits: list[Orbit],
+    satellite_ids: dict[int, SatelliteRef] | None = None,
 ) -> list[NewOrbit]:
-    """
-    Use two statements:
-        1. Create satellite records which don't exist yet for the orbits
-        2. Insert orbit rows from values if they don't exist
+    """Insert a batch of validated Orbit models"""
+    satellites = {}
+    orbit_rows = []
+    for orbit in orbits:
+        norad_id = int(orbit.satellite.norad_id)
+        satellites.setdefault(norad_id, orbit.satellite.model_dump(exclude={"norad_id"}))
+        row = orbit.model_dump(exclude={"satellite", "created_at", "updated_at"})
+        row["norad_id"] = norad_id
+        orbit_rows.append(row)
+    return insert_orbit_rows(db_session, satellites, orbit_rows, satellite_ids)
+
+
+def batch_insert_orbit_columns(
+    db_session: Session,
+    columns: OrbitColumns,
+    satellite_ids: dict[int, SatelliteRef] | None = None,
+) -> list[NewOrbit]:
+    """Insert a batch of orbits given as validated columns"""
+    satellites, orbit_rows = columns.to_rows()
+    return insert_orbit_rows(db_session, satellites, orbit_rows, satellite_ids)
 
-    TODO: Rewrite this SQL query to do the inserts at the same time
+
+def insert_orbit_rows(
+    db_session: Session,
+    satellites: dict[int, dict[str, Any]],
+    orbit_rows: list[dict[str, Any]],
+    satellite_ids: dict[int, SatelliteRef] | None = None,
+) -> list[NewOrbit]:
     """
-    def gen_satellite_data(orbits: list[Orbit]) -> Iterator[tuple[dict[str, Any], int]]:
+    Insert orbit rows keyed by NORAD id:
+        1. Create satellite records for NORAD ids missing from the satellite_ids
+           map and look up their ids. Skipped when every satellite is cached.
+        2. Insert orbit rows which don't exist yet, returning only the columns
+           needed for NewOrbit
+
+    The satellite_ids map from NORAD id is updated in place so it can be reused
+    across batches.
+    """
+    if satellite_ids is None:
+        satellite_ids = {}
+    missing = [norad_id for norad_id in satellites if norad_id not in satellite_ids]
+    if missing:
         updated_at = datetime.now(UTC)
-        for orbit in orbits:
+        satellite_data = []
+        for norad_id in missing:
+            satellite = satellites[norad_id]
             data = {
-                "norad_id": orbit.satellite.norad_id,
-                "intl_designator": orbit.satellite.intl_designator,
-                "name": orbit.satellite.name,
+                "norad_id": norad_id,
+                "intl_designator": satellite["intl_designator"],
+                "name": satellite["name"],
                 "updated_at": updated_at,
             }
-            if launch_date := orbit.satellite.launch_date:
+            if launch_date := satellite["launch_date"]:
                 data["launch_date"] = launch_date
-            yield data, int(orbit.satellite.norad_id)
+            satellite_data.append(data)
+        stmt = insert(db.Satellite).on_conflict_do_nothing(index_elements=["norad_id"])
+        db_session.execute(stmt, satellite_data)
+        stmt = (
+            select(db.Satellite.norad_id, db.Satellite.id, db.Satellite.name)
+            .where(db.Satellite.norad_id.in_(missing))
+        )
+        for norad_id, satellite_id, name in db_session.execute(stmt):
+            satellite_ids[norad_id] = SatelliteRef(satellite_id, name)
+
+    norad_ids = {}
+    for row in orbit_rows:
+        norad_id = row.pop("norad_id")
+        satellite = satellite_ids[norad_id]
+        norad_ids[satellite.id] = norad_id
+        row["satellite_id"] = satellite.id
+    insert_orbits_stmt = (insert(db.Orbit)
+        .on_conflict_do_nothing(index_elements=["satellite_id", "epoch", "originator"])
+        .returning(db.Orbit.id, db.Orbit.satellite_id, db.Orbit.epoch, db.Orbit.originator)
+    )
+    res = db_session.execute(insert_orbits_stmt, orbit_rows)
+    new_orbits = []
+    for orbit_id, satellite_id, epoch, originator in res:
+        norad_id = norad_ids[satellite_id]
+        new_orbits.append(NewOrbit(
+            orbit_id=orbit_id,
+            satellite_id=satellite_id,
+            norad_id=norad_id,
+            name=satellite_ids[norad_id].name,
+            epoch=epoch,
+            originator=originator,
+        ))
+    update_latest_orbits(db_session, new_orbits)
+    return new_orbits
+
 
-    orbit_satellite_data, orbit_norad_ids = zip(*gen_satellite_data(orbits))
+OrbitKey = tuple[int, datetime, str | None]
 
-    stmt = insert(db.Satellite).on_conflict_do_nothing(index_elements=["norad_id"])
-    db_session.execute(stmt, orbit_satellite_data)
 
+def orbit_key(norad_id: int, epoch: datetime, originator: str | None) -> OrbitKey:
+    """Key of the orbit unique constraint, with the epoch as a naive UTC datetime"""
+    if epoch.tzinfo is not None:
+        epoch = epoch.astimezone(UTC).replace(tzinfo=None)
+    return int(norad_id), epoch, originator
+
+
+def query_known_orbit_keys(
+    db_session: Session,
+    norad_ids: list[int],
+    since: datetime,
+) -> set[OrbitKey]:
+    """Return keys of stored orbits for the satellites with an epoch at or after since"""
     stmt = (
-        select(
-            db.Satellite.norad_id,
-            db.Satellite.id.label("satellite_id"),
+        select(db.Satellite.norad_id, db.Orbit.epoch, db.Orbit.originator)
+        .join(db.Satellite, db.Satellite.id == db.Orbit.satellite_id)
+        .where(
+            db.Satellite.norad_id.in_(norad_ids),
+            db.Orbit.epoch >= since,
         )
-        .where(db.Satellite.norad_id.in_(orbit_norad_ids))
     )
     res = db_session.execute(stmt)
-    rows = res.all()
-    norad_id_to_satellite_id = {r[0]: r[1] for r in rows}
-    # Update orbit records with corresponding satellite_id
-    def gen_orbit_data(orbits: list[Orbit]) -> Iterator[dict[str, Any]]:
-        for orbit in orbits:
-            data = orbit.model_dump()
-            data["satellite_id"] = norad_id_to_satellite_id[orbit.satellite.norad_id]
-            yield data
-
-    orbit_data = list(gen_orbit_data(orbits))
-    insert_orbits_stmt = (insert(db.Orbit)
-        .on_conflict_do_nothing(index_elements=["satellite_id", "epoch", "originator"])
-        .returning(db.Orbit)
-        .options(selectinload(db.Orbit.satellite))
+    return {orbit_key(*row) for row in res}
+
+
+def update_latest_orbits(
+    db_session: Session,
+    orbits: list[NewOrbit],
+) -> None:
+    """
+    Point latest_orbit rows at new orbits whose epoch is newer than the stored one.
+    Each written row gets the next version number. SQLite allows one writer at a
+    time, so versions increase in commit order.
+    """
+    latest = {}
+    for orbit in orbits:
+        current = latest.get(orbit.satellite_id)
+        if current is None or orbit.epoch > current["epoch"]:
+            latest[orbit.satellite_id] = {
+                "satellite_id": orbit.satellite_id,
+                "orbit_id": orbit.orbit_id,
+                "epoch": orbit.epoch,
+            }
+    if not latest:
+        return
+    next_version = (
+        select(func.coalesce(func.max(db.LatestOrbit.version), 0) + 1)
+        .correlate(None)
+        .scalar_subquery()
     )
-    res = db_session.scalars(insert_orbits_stmt, orbit_data)
-    inserted_orbits = cast(list[db.Orbit], res.all())
-    db_session.flush()
-    new_orbits = [
-        NewOrbit(
-            orbit_id=orbit.id,
-            satellite_id=orbit.satellite_id,
-            norad_id=orbit.satellite.norad_id,
-            name=orbit.satellite.name,
-            epoch=orbit.epoch,
-            originator=orbit.originator,
-        )
-        for orbit in inserted_orbits
-    ]
-    return new_orbits
+    stmt = insert(db.LatestOrbit).values(version=next_version)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["satellite_id"],
+        set_={
+            "orbit_id": stmt.excluded.orbit_id,
+            "epoch": stmt.excluded.epoch,
+            "version": next_version,
+        },
+        where=stmt.excluded.epoch > db.LatestOrbit.epoch,
+    )
+    db_session.execute(stmt, list(latest.values()))
@@ -0,0 +1,69 @@
+from collections.abc import Iterator
+import json
+import re
+from typing import Any, IO
+
+
+__all__ = [
+    "iter_json_array",
+]
+
+
+WHITESPACE = re.compile(r"\s*")
+DELIMITERS = frozenset(",] \t\n\r")
+
+
+def iter_json_array(fp: IO[str], chunk_size: int = 65536) -> Iterator[Any]:
+    """
+    Yield the items of a top-level JSON array read from a text file object.
+    Only the item being decoded and one chunk are held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos = "", 0
+
+    def read_more() -> bool:
+        nonlocal buffer, pos
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def peek() -> str:
+        """Skip whitespace and return the next character, or '' at end of file"""
+        nonlocal pos
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more():
+                return ""
+
+    if peek() != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    if peek() == "]":
+        return
+    while True:
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The item is truncated at the end of the buffer
+            if read_more():
+                continue
+            raise
+        if (end == len(buffer) or buffer[end] not in DELIMITERS) and read_more():
+            # A number cut at the end of the chunk, like "2." of "2.5", decodes
+            # as a shorter number. Decode again once the next delimiter is read.
+            continue
+        pos = end
+        yield item
+        char = peek()
+        if char == ",":
+            pos += 1
+            peek()
+        elif char == "]":
+            return
+        else:
+            raise ValueError(f"Expected ',' or ']' in JSON array, found {char!r}")
@@ -0,0 +1,137 @@
+from datetime import datetime, UTC
+from itertools import batched
+import logging
+from typing import cast
+
+from hatchet_sdk import Context
+from pydantic import BaseModel
+from sqlalchemy import delete, text, Engine, Uuid
+
+from api.settings import config
+from api import db
+from ..client import hatchet
+
+
+__all__ = [
+    "CompactOrbits",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+class CompactOrbitsOptions(BaseModel):
+    keep_recent: int = config.retention.keep_recent
+    history_interval_days: float = config.retention.history_interval_days
+    batch_size: int = config.retention.batch_size
+    vacuum_pages: int = config.retention.vacuum_pages
+
+
+class DeleteStepOutput(BaseModel):
+    rows_deleted: int
+    batches: int
+    duration: float
+
+
+class VacuumStepOutput(BaseModel):
+    auto_vacuum: int
+    pages_before: int
+    pages_after: int
+    bytes_reclaimed: int
+    duration: float
+
+
+# Keep the newest `keep_recent` orbits of each satellite, and for older orbits
+# keep only the newest one in each `interval` day bucket. Orbits referenced
+# by latest_orbit are never selected.
+SELECT_EXPIRED_ORBITS = text("""
+    WITH ranked AS (
+        SELECT
+            id,
+            row_number() OVER (
+                PARTITION BY satellite_id ORDER BY epoch DESC
+            ) AS recent_rank,
+            row_number() OVER (
+                PARTITION BY satellite_id, CAST(julianday(epoch) / :interval AS INTEGER)
+                ORDER BY epoch DESC
+            ) AS bucket_rank
+        FROM orbit
+    )
+    SELECT id FROM ranked
+    WHERE recent_rank > :keep_recent
+        AND bucket_rank > 1
+        AND id NOT IN (SELECT orbit_id FROM latest_orbit)
+""").columns(id=Uuid(as_uuid=True))
+
+
+@hatchet.workflow(
+    on_events=["orbits:compact"],
+    on_crons=[config.retention.cron],
+    input_validator=CompactOrbitsOptions,
+)
+class CompactOrbits:
+
+    def __init__(
+        self,
+        engine: Engine,
+    ):
+        self.engine = engine
+
+    @hatchet.step(timeout="30m")
+    def delete_expired_orbits(self, context: Context) -> DeleteStepOutput:
+        """Delete expired orbits in bounded batches so readers are not locked out"""
+        options = cast(CompactOrbitsOptions, context.workflow_input())
+        t0 = datetime.now(UTC)
+        with self.engine.connect() as conn:
+            res = conn.execute(
+                SELECT_EXPIRED_ORBITS,
+                {
+                    "keep_recent": max(options.keep_recent, 1),
+                    "interval": options.history_interval_days,
+                },
+            )
+            expired_ids = res.scalars().all()
+        rows_deleted, batches = 0, 0
+        for orbit_ids in batched(expired_ids, options.batch_size):
+            # One short transaction per batch
+            with self.engine.begin() as conn:
+                res = conn.execute(delete(db.Orbit).where(db.Orbit.id.in_(orbit_ids)))
+                rows_deleted += res.rowcount
+            batches += 1
+        duration = (datetime.now(UTC) - t0).total_seconds()
+        context.log(f"Deleted {rows_deleted} expired orbits in {batches} batches, {duration:.1f} sec")
+        return DeleteStepOutput(rows_deleted=rows_deleted, batches=batches, duration=duration)
+
+    @hatchet.step(parents=["delete_expired_orbits"], timeout="30m")
+    def incremental_vacuum(self, context: Context) -> VacuumStepOutput:
+        """Return free pages to the filesystem and report the bytes reclaimed"""
+        options = cast(CompactOrbitsOptions, context.workflow_input())
+        t0 = datetime.now(UTC)
+        with self.engine.connect() as conn:
+            page_size = conn.exec_driver_sql("PRAGMA page_size").scalar_one()
+            auto_vacuum = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar_one()
+            pages_before = conn.exec_driver_sql("PRAGMA page_count").scalar_one()
+            if auto_vacuum == 2:
+                # incremental_vacuum frees all pages when the argument is zero. The
+                # statement frees pages as it is stepped, so fetch until done.
+                cursor = conn.connection.cursor()
+                cursor.execute(f"PRAGMA incremental_vacuum({int(options.vacuum_pages)})")
+                cursor.fetchall()
+                cursor.close()
+                conn.commit()
+            else:
+                context.log(
+                    "Database auto_vacuum is not INCREMENTAL, skipping incremental vacuum. "
+                    "Run 'alembic upgrade head' once to convert the database."
+                )
+            pages_after = conn.exec_driver_sql("PRAGMA page_count").scalar_one()
+        duration = (datetime.now(UTC) - t0).total_seconds()
+        bytes_reclaimed = (pages_before - pages_after) * page_size
+        context.log(f"Incremental vacuum reclaimed {bytes_reclaimed} bytes, {duration:.1f} sec")
+        return VacuumStepOutput(
+            auto_vacuum=auto_vacuum,
+            pages_before=pages_before,
+            pages_after=pages_after,
+            bytes_reclaimed=bytes_reclaimed,
+            duration=duration,
+        )
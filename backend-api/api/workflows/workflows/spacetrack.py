@@ -1,19 +1,25 @@
+from collections import Counter, deque
+from collections.abc import Iterable, Iterator
 from datetime import datetime, UTC
 import logging
 from itertools import batched
-from typing import cast, TypedDict
-import json
-import tempfile
+from time import perf_counter
+from typing import cast, Any, TypedDict
 import gzip
+import json
 
 import httpx
 from hatchet_sdk import Context
 from hatchet_sdk.rate_limit import RateLimit
 from pydantic import BaseModel, SecretStr, computed_field
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
 
 from api.settings import config
 from ..client import hatchet
-from .insert_orbits import Orbit, Satellite, NewOrbit
+from .insert_orbits import NewOrbit, OrbitKey, orbit_key, query_known_orbit_keys
+from .blobs import BlobRef, blob_store
+from .jsonstream import iter_json_array
 
 
 __all__ = [
@@ -24,6 +30,9 @@ __all__ = [
 logger = logging.getLogger(__name__)
 
 
+PARSE_RETRIES = 2
+
+
 class SpacetrackJson(TypedDict):
     CCSDS_OMM_VERS: str
     COMMENT: str
@@ -72,18 +81,23 @@ class FetchSpacetrackOrbitOptions(BaseModel):
     auth_endpoint: str = config.spacetrack.auth_endpoint
     epoch_days_since: float = config.spacetrack.gp_epoch_days_since
     timeout: float = config.spacetrack.http_timeout
+    chunk_size: int = config.spacetrack.stream_chunk_size
     # include_unknown: bool = False
 
 
 class DownloadStepOutput(BaseModel):
     request_url: str
     status_code: int
-    fname: str
+    blob: BlobRef
     queried_at: datetime
 
 
 class NewOrbitOutput(BaseModel):
     new_orbits: list[NewOrbit]
+    skipped: int = 0   # records already stored, dropped before insert
+    parsed: int = 0
+    # Records per second transposed into columns. Validation runs in InsertOrbitBatch.
+    transpose_rate: float = 0
 
     @computed_field
     @property
@@ -102,8 +116,10 @@ class FetchSpacetrackOrbits:
         self,
         username: str,
         password: str | SecretStr,
+        engine: Engine | None = None,
     ):
         self.username = username
+        self.engine = engine
         if hasattr(password, "get_secret_value"):
             self.password = password.get_secret_value()
         else:
@@ -128,107 +144,219 @@ class FetchSpacetrackOrbits:
         ) as client:
             # Login first to get authentication cookies
             credentials = {"identity": self.username, "password": self.password}
-            try:
-                login_response = await client.post(options.auth_endpoint, data=credentials)
-                context.log("Logged in to spacetrack")
-                response = await client.get(endpoint)
-            except httpx.RequestError as exc:
-                context.log(
-                    (
-                        f"HTTP request error downloading orbits from spacetrack, "
-                        f"URL: {exc.request.url}, {repr(exc)}"
+            # Stream the response body into a compressed blob
+            with blob_store.writer() as writer:
+                try:
+                    login_response = await client.post(options.auth_endpoint, data=credentials)
+                    context.log("Logged in to spacetrack")
+                    async with client.stream("GET", endpoint) as response:
+                        with gzip.GzipFile(fileobj=writer, mode="wb") as gz:
+                            async for chunk in response.aiter_bytes(options.chunk_size):
+                                gz.write(chunk)
+                except httpx.RequestError as exc:
+                    context.log(
+                        (
+                            f"HTTP request error downloading orbits from spacetrack, "
+                            f"URL: {exc.request.url}, {repr(exc)}"
+                        )
                     )
-                )
-                raise
+                    raise
         queried_at = datetime.now(UTC)
-        # Save response content to temporary file
-        with tempfile.NamedTemporaryFile(
-            prefix=context.workflow_run_id(),
-            suffix=".gz",
-            mode="wb",
-            delete=False,
-            delete_on_close=False,
-        ) as f:
-            with gzip.GzipFile(fileobj=f, mode="wb") as gz:
-                gz.write(response.content)
-                fname = f.name
         return DownloadStepOutput(
             request_url=str(response.request.url),
             status_code=response.status_code,
-            fname=fname,
+            blob=writer.ref,
             queried_at=queried_at,
         )
 
     @hatchet.step(
         parents=["download_orbit_data"],
-        retries=2,
+        retries=PARSE_RETRIES,
         timeout="10m",
     )
     def parse_and_insert_orbits_to_database(self, context: Context) -> NewOrbitOutput:
         download_output = context.step_output("download_orbit_data")
         if isinstance(download_output, dict):
             download_output = DownloadStepOutput.model_validate(download_output)
-        with gzip.GzipFile(download_output.fname, mode="rb") as gz:
-            spacetrack_data = json.load(gz)
-        parsed_orbits_gen = (
-            _spacetrack_data_to_orbit(data, downloaded_at=download_output.queried_at)
-            for data in spacetrack_data
-        )
-        # batch orbit updates and insert synchronously
+        # Keep the download for a retry of this step, otherwise remove it when done
+        try:
+            output = self._parse_and_insert_orbits(context, download_output)
+        except Exception:
+            if context.retry_count() >= PARSE_RETRIES:
+                blob_store.delete(download_output.blob)
+            raise
+        blob_store.delete(download_output.blob)
+        return output
+
+    def _parse_and_insert_orbits(
+        self,
+        context: Context,
+        download_output: DownloadStepOutput,
+    ) -> NewOrbitOutput:
         new_orbits = []
-        for orbits in batched(parsed_orbits_gen, config.orbit_insert_batch):
-            orbit_data = [orbit.model_dump(mode="json") for orbit in orbits]
-            insert_workflow = context.spawn_workflow(
-                "InsertOrbitBatch",
-                {"orbits": orbit_data},
-            )
-            result_data = insert_workflow.sync_result()["insert_orbits"]
-            new_orbits.extend(NewOrbit.model_validate(data) for data in result_data["new_orbits"])
-        return NewOrbitOutput(new_orbits=new_orbits)
+        counts = Counter()
+        transpose_time = 0.0
+        # Parse the array incrementally so only the current batch of orbits is held in memory
+        fname = blob_store.path(download_output.blob)
+        # Spawn insert batches while parsing continues, with a bounded number in
+        # flight. The InsertOrbitBatch concurrency key serializes the writes.
+        in_flight = deque()
+        try:
+            with gzip.open(fname, mode="rt", encoding="utf-8") as fp:
+                records = iter_json_array(fp, config.spacetrack.stream_chunk_size)
+                if self.engine is not None:
+                    records = _drop_known_records(self.engine, records, counts)
+                for batch in batched(records, config.orbit_insert_batch):
+                    t0 = perf_counter()
+                    columns = _spacetrack_columns(batch, downloaded_at=download_output.queried_at)
+                    transpose_time += perf_counter() - t0
+                    counts["parsed"] += len(batch)
+                    # Pass the batch by reference instead of through the Hatchet engine
+                    ref = blob_store.put(json.dumps({"columns": columns}).encode())
+                    try:
+                        insert_workflow = context.spawn_workflow(
+                            "InsertOrbitBatch",
+                            {"blob": ref.model_dump()},
+                        )
+                    except Exception:
+                        blob_store.delete(ref)
+                        raise
+                    in_flight.append((ref, insert_workflow))
+                    if len(in_flight) >= config.orbit_insert_in_flight:
+                        new_orbits.extend(_collect_insert_result(*in_flight.popleft()))
+            while in_flight:
+                new_orbits.extend(_collect_insert_result(*in_flight.popleft()))
+        finally:
+            # Batches not collected after an error
+            for ref, _ in in_flight:
+                blob_store.delete(ref)
+        transpose_rate = counts["parsed"] / transpose_time if transpose_time > 0 else 0.0
+        context.log(
+            f"Parsed {counts['parsed']} records, transposed at {transpose_rate:.0f} records/sec, "
+            f"inserted {len(new_orbits)} new orbits, skipped {counts['skipped']} stored orbits"
+        )
+        return NewOrbitOutput(
+            new_orbits=new_orbits,
+            skipped=counts["skipped"],
+            parsed=counts["parsed"],
+            transpose_rate=transpose_rate,
+        )
 
 
-def _spacetrack_data_to_orbit(
-    data: SpacetrackJson,
-    *,
-    downloaded_at: datetime = None,
-) -> Orbit:
-    """ Parse JSON response from spacetrack and return Orbit model """
+def _collect_insert_result(ref: BlobRef, insert_workflow) -> list[NewOrbit]:
+    """Wait for an InsertOrbitBatch run and remove its input blob"""
     try:
-        tle = "\n".join((data["TLE_LINE1"], data["TLE_LINE2"]))
-    except KeyError:
-        tle = None
-    sat_intl_designator = data.get("OBJECT_ID")
-    if sat_intl_designator == "UNKNOWN":
-        sat_intl_designator = None
-    sat_name = data.get("OBJECT_NAME")
-    if sat_name == "TBA - TO BE ASSIGNED":
-        sat_name = None
-    return Orbit(
-        epoch=data["EPOCH"],
-        inclination=data["INCLINATION"],
-        eccentricity=data["ECCENTRICITY"],
-        ra_of_asc_node=data["RA_OF_ASC_NODE"],
-        arg_of_pericenter=data['ARG_OF_PERICENTER'],
-        mean_anomaly=data["MEAN_ANOMALY"],
-        bstar=data["BSTAR"],
-        mean_motion=data["MEAN_MOTION"],
-        mean_motion_dot=data["MEAN_MOTION_DOT"],
-        mean_motion_ddot=data["MEAN_MOTION_DDOT"],
-        rev_at_epoch=data["REV_AT_EPOCH"],
-        originator=data["ORIGINATOR"],
-        originator_created_at=data["CREATION_DATE"],
-        downloaded_at=downloaded_at,
-        perigee=data["PERIAPSIS"],
-        apogee=data["APOAPSIS"],
-        time_system=data["TIME_SYSTEM"],
-        ref_frame=data["REF_FRAME"],
-        mean_element_theory=data["MEAN_ELEMENT_THEORY"],
-        ephemeris_type=data.get("EPHEMERIS_TYPE"),
-        tle=tle,
-        satellite=Satellite(
-            norad_id=data["NORAD_CAT_ID"],
-            intl_designator=sat_intl_designator,
-            name=sat_name,
-            launch_date=data["LAUNCH_DATE"],
-        ),
+        result_data = insert_workflow.sync_result()["insert_orbits"]
+    finally:
+        blob_store.delete(ref)
+    return [NewOrbit.model_validate(data) for data in result_data["new_orbits"]]
+
+
+def _spacetrack_orbit_key(data: SpacetrackJson) -> OrbitKey:
+    return orbit_key(
+        data["NORAD_CAT_ID"],
+        datetime.fromisoformat(data["EPOCH"]),
+        data["ORIGINATOR"],
     )
+
+
+def _drop_known_records(
+    engine: Engine,
+    records: Iterable[SpacetrackJson],
+    counts: Counter,
+) -> Iterator[SpacetrackJson]:
+    """
+    Drop records whose orbit is already stored before they are validated and sent
+    to the database. Stored keys are looked up once per chunk of records.
+    """
+    for chunk in batched(records, config.orbit_filter_batch):
+        keys = [_spacetrack_orbit_key(data) for data in chunk]
+        with Session(engine) as db_session:
+            known_keys = query_known_orbit_keys(
+                db_session,
+                norad_ids=list({key[0] for key in keys}),
+                since=min(key[1] for key in keys),
+            )
+        for data, key in zip(chunk, keys):
+            if key in known_keys:
+                counts["skipped"] += 1
+            else:
+                yield data
+
+
+# Orbit column name and Spacetrack GP field of the columns copied unchanged
+SPACETRACK_COLUMN_FIELDS = (
+    ("norad_id", "NORAD_CAT_ID"),
+    ("intl_designator", "OBJECT_ID"),
+    ("name", "OBJECT_NAME"),
+    ("launch_date", "LAUNCH_DATE"),
+    ("epoch", "EPOCH"),
+    ("inclination", "INCLINATION"),
+    ("eccentricity", "ECCENTRICITY"),
+    ("ra_of_asc_node", "RA_OF_ASC_NODE"),
+    ("arg_of_pericenter", "ARG_OF_PERICENTER"),
+    ("mean_anomaly", "MEAN_ANOMALY"),
+    ("bstar", "BSTAR"),
+    ("mean_motion", "MEAN_MOTION"),
+    ("mean_motion_dot", "MEAN_MOTION_DOT"),
+    ("mean_motion_ddot", "MEAN_MOTION_DDOT"),
+    ("rev_at_epoch", "REV_AT_EPOCH"),
+    ("originator", "ORIGINATOR"),
+    ("originator_created_at", "CREATION_DATE"),
+    ("perigee", "PERIAPSIS"),
+    ("apogee", "APOAPSIS"),
+    ("time_system", "TIME_SYSTEM"),
+    ("ref_frame", "REF_FRAME"),
+    ("mean_element_theory", "MEAN_ELEMENT_THEORY"),
+    ("element_set_no", "ELEMENT_SET_NO"),
+    ("ephemeris_type", "EPHEMERIS_TYPE"),
+)
+
+# Fields without which a record can't be stored. A record missing one fails
+# here instead of inside InsertOrbitBatch.
+SPACETRACK_REQUIRED_FIELDS = frozenset((
+    "NORAD_CAT_ID",
+    "EPOCH",
+    "INCLINATION",
+    "ECCENTRICITY",
+    "RA_OF_ASC_NODE",
+    "ARG_OF_PERICENTER",
+    "MEAN_ANOMALY",
+    "BSTAR",
+    "MEAN_MOTION",
+    "MEAN_MOTION_DOT",
+    "MEAN_MOTION_DDOT",
+    "ORIGINATOR",
+    "CREATION_DATE",
+))
+
+
+def _spacetrack_columns(
+    records: Iterable[SpacetrackJson],
+    *,
+    downloaded_at: datetime | None = None,
+) -> dict[str, Any]:
+    """
+    Transpose Spacetrack GP records into the raw columns of OrbitColumns in one
+    pass. Values are validated once per column by InsertOrbitBatch.
+    """
+    columns = {column: [] for column, _ in SPACETRACK_COLUMN_FIELDS}
+    required = [
+        (columns[column].append, field) for column, field in SPACETRACK_COLUMN_FIELDS
+        if field in SPACETRACK_REQUIRED_FIELDS
+    ]
+    optional = [
+        (columns[column].append, field) for column, field in SPACETRACK_COLUMN_FIELDS
+        if field not in SPACETRACK_REQUIRED_FIELDS
+    ]
+    tle = columns["tle"] = []
+    for data in records:
+        for append, field in required:
+            append(data[field])
+        for append, field in optional:
+            append(data.get(field))
+        line1, line2 = data.get("TLE_LINE1"), data.get("TLE_LINE2")
+        tle.append(f"{line1}\n{line2}" if line1 and line2 else None)
+    if downloaded_at is not None:
+        columns["downloaded_at"] = downloaded_at.isoformat()
+    return columns
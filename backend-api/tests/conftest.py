@@ -0,0 +1,18 @@
+import base64
+import json
+import os
+
+
+def _unsigned_jwt(claims: dict) -> str:
+    def encode(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    return f"{encode({'alg': 'none'})}.{encode(claims)}."
+
+
+# Importing api.workflows creates the Hatchet client, which reads the tenant and
+# server addresses from the token. No connection is made until a worker starts.
+os.environ.setdefault("HATCHET__TOKEN", _unsigned_jwt({
+    "sub": "00000000-0000-0000-0000-000000000000",
+    "server_url": "http://localhost:8888",
+    "grpc_broadcast_address": "localhost:7077",
+}))
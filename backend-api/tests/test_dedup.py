@@ -0,0 +1,18 @@
+from api.workflows.workflows.dedup import OrbitDeduplicator
+
+
+def record(norad_id, epoch="2024-03-01T12:00:00", originator="18 SPCS"):
+    return {"NORAD_CAT_ID": norad_id, "EPOCH": epoch, "ORIGINATOR": originator, "OBJECT_NAME": str(norad_id)}
+
+
+def test_duplicates_counted_per_group():
+    dedup = OrbitDeduplicator()
+    active = list(dedup.add("active", [record(1), record(2), record(2)]))
+    visual = list(dedup.add("visual", [record("2"), record(3), record(1, epoch="2024-03-02T00:00:00")]))
+    stations = list(dedup.add("stations", [record(1), record(3), record(3, originator=None)]))
+    assert [r["NORAD_CAT_ID"] for r in active] == [1, 2]
+    assert [r["NORAD_CAT_ID"] for r in visual] == [3, 1]
+    assert [r["NORAD_CAT_ID"] for r in stations] == [3]
+    assert dedup.duplicates == {"active": 1, "visual": 1, "stations": 2}
+    assert dedup.duplicates.total() == 4
+    assert len(dedup) == 5
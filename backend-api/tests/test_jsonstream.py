@@ -0,0 +1,33 @@
+import io
+import json
+
+import pytest
+
+from api.workflows.workflows.jsonstream import iter_json_array
+
+
+SCALARS = '[2.5, 1e5, -0.25, 1E-3, 12345678, true, false, null, "a,]b", 3]'
+
+
+@pytest.mark.parametrize("chunk_size", range(1, len(SCALARS) + 2))
+def test_scalars_split_at_every_chunk_size(chunk_size):
+    items = list(iter_json_array(io.StringIO(SCALARS), chunk_size))
+    assert items == json.loads(SCALARS)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64])
+def test_objects_and_whitespace(chunk_size):
+    text = ' [ {"a": [1, 2.5]} ,\n{"b": {"c": -1e2}}\n] '
+    items = list(iter_json_array(io.StringIO(text), chunk_size))
+    assert items == json.loads(text)
+
+
+@pytest.mark.parametrize("text", ["[]", " [ ] "])
+def test_empty_array(text):
+    assert list(iter_json_array(io.StringIO(text), 1)) == []
+
+
+@pytest.mark.parametrize("text", ["{}", "[1 2]", "[1x]", "[1,"])
+def test_invalid(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), 2))
@@ -0,0 +1,31 @@
+import json
+from importlib.resources import files
+
+import pytest
+
+from api.workflows.workflows.spacetrack import SPACETRACK_REQUIRED_FIELDS, _spacetrack_columns
+
+
+@pytest.fixture
+def records() -> list[dict]:
+    path = files("api.workflows.workflows") / "spacetrack_example.json"
+    return json.loads(path.read_text())
+
+
+def test_columns(records):
+    columns = _spacetrack_columns(records)
+    assert columns["norad_id"] == [record["NORAD_CAT_ID"] for record in records]
+    assert columns["originator_created_at"] == [record["CREATION_DATE"] for record in records]
+    assert all(len(values) == len(records) for values in columns.values())
+
+
+@pytest.mark.parametrize("field", sorted(SPACETRACK_REQUIRED_FIELDS))
+def test_missing_required_field(records, field):
+    del records[1][field]
+    with pytest.raises(KeyError, match=field):
+        _spacetrack_columns(records)
+
+
+def test_missing_optional_field(records):
+    del records[1]["APOAPSIS"]
+    assert _spacetrack_columns(records)["apogee"][1] is None
@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from api.domain import Location, Orbit, Satellite
+from api.passes import service
+
+
+START = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+END = START + timedelta(days=2)
+LOCATION = Location(latitude=32.1, longitude=-97.5, height=200)
+
+
+def make_satellite(norad_id, inc, ecc, raan, argp, ma, n) -> Satellite:
+    orbit = Orbit(
+        satellite_id=norad_id,
+        epoch=START,
+        inclination=inc,
+        eccentricity=ecc,
+        ra_of_asc_node=raan,
+        arg_of_pericenter=argp,
+        mean_anomaly=ma,
+        bstar=1e-4,
+        mean_motion=n,
+        mean_motion_dot=0.0,
+        mean_motion_ddot=0.0,
+    )
+    return Satellite(norad_id=norad_id, intl_designator="", name=str(norad_id), orbits=[orbit])
+
+
+SATELLITES = [
+    make_satellite(25544, 51.64, 0.0005, 200.0, 60.0, 300.0, 15.5),
+    make_satellite(33591, 99.1, 0.0013, 120.0, 200.0, 160.0, 14.13),
+    make_satellite(12, 32.9, 0.166, 60.0, 300.0, 50.0, 11.88),
+]
+
+
+async def collect(**kwargs) -> list:
+    return [op async for op in service.stream_passes(SATELLITES, LOCATION, START, END, razel_step=0, **kwargs)]
+
+
+def pass_keys(overpasses) -> list[tuple[int, float]]:
+    return [(op.norad_id, op.aos.datetime.timestamp()) for op in overpasses]
+
+
+def assert_same_passes(expected, actual):
+    assert [norad_id for norad_id, _ in actual] == [norad_id for norad_id, _ in expected]
+    for (_, aos), (_, ref_aos) in zip(actual, expected):
+        assert aos == pytest.approx(ref_aos, abs=1.0)
+
+
+@pytest.fixture(scope="module")
+def full_passes():
+    overpasses = asyncio.run(service.predict_passes(SATELLITES, LOCATION, START, END, razel_step=0))
+    return pass_keys(overpasses)
+
+
+@pytest.mark.parametrize("chunk_seconds", [1800, 21600, 2 * 86400])
+def test_merged_stream_matches_full_prediction(full_passes, chunk_seconds):
+    overpasses = asyncio.run(collect(merge=True, chunk_seconds=chunk_seconds))
+    assert [op.aos.datetime for op in overpasses] == sorted(op.aos.datetime for op in overpasses)
+    assert_same_passes(full_passes, pass_keys(overpasses))
+
+
+@pytest.mark.parametrize("chunk_seconds", [1800, 21600])
+def test_unmerged_stream_has_every_pass(full_passes, chunk_seconds):
+    overpasses = asyncio.run(collect(merge=False, chunk_seconds=chunk_seconds))
+    assert_same_passes(full_passes, sorted(pass_keys(overpasses), key=lambda key: key[1]))
+
+
+@pytest.mark.parametrize("merge", [True, False])
+def test_first_pass_sent_before_slowest_satellite_finishes(monkeypatch, merge):
+    predict_passes = service.predict_passes
+    slow_norad_id = 12
+    slow_finished = asyncio.Event()
+
+    async def slow_predict_passes(satellites, location, start, end, **kwargs):
+        overpasses = await predict_passes(satellites, location, start, end, **kwargs)
+        if satellites[0].norad_id == slow_norad_id:
+            await asyncio.sleep(0.05)
+            if end >= END:
+                slow_finished.set()
+        return overpasses
+
+    monkeypatch.setattr(service, "predict_passes", slow_predict_passes)
+
+    async def first_pass():
+        stream = service.stream_passes(SATELLITES, LOCATION, START, END, merge=merge, chunk_seconds=21600, razel_step=0)
+        try:
+            overpass = await anext(stream)
+            return overpass, slow_finished.is_set()
+        finally:
+            await stream.aclose()
+
+    overpass, finished = asyncio.run(first_pass())
+    assert overpass is not None
+    assert not finished
+
+
+def test_error_in_a_satellite_is_raised(monkeypatch):
+    predict_passes = service.predict_passes
+
+    async def failing_predict_passes(satellites, location, start, end, **kwargs):
+        if satellites[0].norad_id == 12 and start > START:
+            raise RuntimeError("propagation failed")
+        return await predict_passes(satellites, location, start, end, **kwargs)
+
+    monkeypatch.setattr(service, "predict_passes", failing_predict_passes)
+    with pytest.raises(RuntimeError, match="propagation failed"):
+        asyncio.run(collect(merge=True, chunk_seconds=21600))
@@ -0,0 +1,77 @@
+import math
+from datetime import datetime, timezone
+
+import pytest
+
+from api.astrodynamics import geometry
+from api.astrodynamics.geometry import R_EARTH, VISIBILITY_MARGIN_KM, footprint_radius, may_be_visible
+from api.domain import Location, Orbit, Satellite
+from api.passes.service import filter_visible_satellites
+
+
+GEO_ALTITUDE = 35786.0
+ISS_ALTITUDE = 420.0
+
+
+def edge_latitude(inclination: float, altitude: float, min_elevation_deg: float = 0) -> float:
+    """Latitude [deg] at the footprint edge plus margin of the northernmost sub-satellite point"""
+    reach = footprint_radius(altitude, min_elevation_deg) + VISIBILITY_MARGIN_KM
+    return inclination + math.degrees(reach / R_EARTH)
+
+
+def test_geo_far_below_horizon_is_dropped():
+    # At 85 deg latitude a GEO satellite is about 4 deg below the horizon
+    assert not may_be_visible(85.0, 0.05, GEO_ALTITUDE)
+    assert not may_be_visible(-85.0, 0.05, GEO_ALTITUDE)
+    # It is above the horizon at 75 deg, but never above 10 deg
+    assert may_be_visible(75.0, 0.05, GEO_ALTITUDE)
+    assert not may_be_visible(75.0, 0.05, GEO_ALTITUDE, min_elevation_deg=10)
+
+
+@pytest.mark.parametrize("latitude", [0.0, 32.1, -51.0, 51.6])
+def test_leo_overhead_is_kept(latitude):
+    assert may_be_visible(latitude, 51.64, ISS_ALTITUDE)
+
+
+@pytest.mark.parametrize("inclination", [45.0, 51.64, 128.4])
+@pytest.mark.parametrize("min_elevation_deg", [0, 10])
+def test_footprint_edge_plus_margin(inclination, min_elevation_deg):
+    max_lat = inclination if inclination <= 90 else 180 - inclination
+    edge = edge_latitude(max_lat, ISS_ALTITUDE, min_elevation_deg)
+    for sign in (1, -1):
+        assert may_be_visible(sign * (edge - 1e-6), inclination, ISS_ALTITUDE, min_elevation_deg)
+        assert not may_be_visible(sign * (edge + 1e-6), inclination, ISS_ALTITUDE, min_elevation_deg)
+
+
+def make_satellite(norad_id: int, inclination: float, mean_motion: float, apogee: float | None = None) -> Satellite:
+    orbit = Orbit(
+        satellite_id=norad_id,
+        epoch=datetime(2024, 3, 1, tzinfo=timezone.utc),
+        inclination=inclination,
+        eccentricity=0.0002,
+        ra_of_asc_node=0.0,
+        arg_of_pericenter=0.0,
+        mean_anomaly=0.0,
+        bstar=0.0,
+        mean_motion=mean_motion,
+        mean_motion_dot=0.0,
+        mean_motion_ddot=0.0,
+        apogee=apogee,
+    )
+    return Satellite(norad_id=norad_id, intl_designator="", name=str(norad_id), orbits=[orbit])
+
+
+def test_filter_visible_satellites():
+    geo = make_satellite(1, 0.05, 1.0027)
+    iss = make_satellite(2, 51.64, 15.5, apogee=ISS_ALTITUDE)
+    # Apogee from mean motion when the orbit has none
+    assert geometry.apogee_altitude(1.0027, 0.0002) == pytest.approx(GEO_ALTITUDE, abs=20)
+    arctic = Location(latitude=85.0, longitude=20.0)
+    assert filter_visible_satellites([geo, iss], arctic, 0) == []
+    texas = Location(latitude=32.1, longitude=-97.5)
+    assert filter_visible_satellites([geo, iss], texas, 0) == [geo, iss]
+    edge = edge_latitude(51.64, ISS_ALTITUDE)
+    inside = Location(latitude=edge - 0.01, longitude=0.0)
+    assert filter_visible_satellites([geo, iss], inside, 0) == [geo, iss]
+    outside = Location(latitude=edge + 0.01, longitude=0.0)
+    assert filter_visible_satellites([geo, iss], outside, 0) == [geo]